@@ -0,0 +1,109 @@
+'''
+Summary:
+import cost of the txmaya tool modules.
+
+Every tool module is imported in a fresh mayapy process: it must stay
+within the import time budget, load no maya plug-in and leave numpy,
+pymel and the engines for the first use.
+
+Usage:
+    mayapy -m pytest tests/test_import_cost.py
+'''
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+PATH_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__)))
+
+# seconds a tool module may take to import
+IMPORT_BUDGET = 0.5
+
+# tool modules, they must import without any heavy dependency
+LIST_LIGHT = ["txmaya.general.file_buffer",
+              "txmaya.modeling.mirrorer",
+              "txmaya.modeling.random_pick",
+              "txmaya.modeling.texel_density_plus",
+              "txmaya.modeling.uv_batch_transfer"]
+
+# modules the tools only load on first use
+LIST_HEAVY = ["numpy",
+              "pymel",
+              "txmaya.general.obj_codec",
+              "txmaya.modeling.mesh_arrays",
+              "txmaya.modeling.mirror_engine",
+              "txmaya.modeling.poisson_pick",
+              "txmaya.modeling.random_pick_engine",
+              "txmaya.modeling.texel_density_engine",
+              "txmaya.modeling.uv_batch_core",
+              "txmaya.modeling.uv_batch_match",
+              "txmaya.modeling.weld_engine"]
+
+# run by the child process: import one module, report what it cost
+SCRIPT = '''
+import json
+import sys
+import time
+
+import maya.standalone
+maya.standalone.initialize()
+import maya.cmds as mc
+
+set_before = set(mc.pluginInfo(query=True, listPlugins=True) or [])
+time_start = time.time()
+__import__(sys.argv[1])
+seconds = time.time() - time_start
+set_after = set(mc.pluginInfo(query=True, listPlugins=True) or [])
+sys.stdout.write("\\n" + json.dumps({
+    "seconds": seconds,
+    "modules": sorted(sys.modules),
+    "plugins": sorted(set_after - set_before)}) + "\\n")
+sys.stdout.flush()
+maya.standalone.uninitialize()
+'''
+
+
+def has_maya():
+    try:
+        import maya.standalone
+    except ImportError:
+        return False
+    return hasattr(maya.standalone, "initialize")
+
+
+def import_cost(name):
+    """
+    Return the report of importing module name in a fresh process
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [PATH_PACKAGE_ROOT] + [i for i in [env.get("PYTHONPATH")] if i])
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT, name],
+                                     env=env)
+    # maya may print its own lines first, the report is the last one
+    lines = output.decode("utf-8", "replace").strip().splitlines()
+    return json.loads(lines[-1])
+
+
+@unittest.skipUnless(has_maya(), "needs mayapy")
+class TestImportCost(unittest.TestCase):
+
+    def test_tool_modules(self):
+        for name in LIST_LIGHT:
+            report = import_cost(name)
+            self.assertLess(report["seconds"], IMPORT_BUDGET,
+                            "{0} took {1:.3f}s to import".format(
+                                name, report["seconds"]))
+            self.assertEqual(report["plugins"], [],
+                             "{0} loaded plug-ins".format(name))
+            list_heavy = [i for i in LIST_HEAVY if i in report["modules"]]
+            self.assertEqual(list_heavy, [],
+                             "{0} imported {1}".format(name, list_heavy))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+'''
+Summary:
+scheduling side of the headless tx UV Batch Transfer, run with stub
+worker commands instead of mayapy.
+
+Usage:
+    python -m pytest tests/test_uv_batch_headless.py
+'''
+
+import os
+import sys
+import time
+import unittest
+
+from txmaya.modeling import uv_batch_headless
+
+
+# stand-in workers by scene name, the result path comes last
+DICT_WORKER = {
+    "ok.mb": '''
+import json, sys
+with open(sys.argv[-1], "w") as f:
+    json.dump({"error": None, "pairs": 2, "transferred": 2}, f)
+''',
+    "fail.mb": '''
+import json, sys
+with open(sys.argv[-1], "w") as f:
+    json.dump({"error": "RuntimeError: boom", "pairs": 3}, f)
+sys.exit(1)
+''',
+    "hang.mb": '''
+import time
+time.sleep(60)
+'''}
+
+
+def make_command(scene, path_result):
+    return [sys.executable, "-c", DICT_WORKER[scene], path_result]
+
+
+class TestRunPool(unittest.TestCase):
+
+    def test_results(self):
+        list_result = []
+        time_start = time.time()
+        report = uv_batch_headless.run_pool(sorted(DICT_WORKER),
+                                            make_command,
+                                            workers=3,
+                                            timeout=2,
+                                            on_result=list_result.append)
+        self.assertLess(time.time() - time_start, 30)
+        self.assertEqual(len(list_result), 3)
+        self.assertEqual(report["files"], 3)
+        self.assertEqual(report["failed"], ["fail.mb", "hang.mb"])
+        self.assertEqual(report["totals"]["pairs"], 5)
+        self.assertEqual(report["totals"]["transferred"], 2)
+        dict_result = dict((i["scene"], i) for i in report["results"])
+        self.assertTrue(dict_result["ok.mb"]["ok"])
+        self.assertEqual(dict_result["fail.mb"]["returncode"], 1)
+        self.assertEqual(dict_result["fail.mb"]["error"],
+                         "RuntimeError: boom")
+        # killed by the timeout, no result written
+        self.assertNotEqual(dict_result["hang.mb"]["returncode"], 0)
+        self.assertNotIn("error", dict_result["hang.mb"])
+
+
+class TestOutputPath(unittest.TestCase):
+
+    def test_same_names_stay_apart(self):
+        list_scene = [os.path.join("shots", "a", "scene.mb"),
+                      os.path.join("shots", "b", "scene.mb")]
+        root = uv_batch_headless.common_root(list_scene)
+        self.assertEqual(root, os.path.abspath("shots"))
+        self.assertEqual([uv_batch_headless.output_path(i, "out", root)
+                          for i in list_scene],
+                         [os.path.join("out", "a", "scene.mb"),
+                          os.path.join("out", "b", "scene.mb")])
+
+    def test_outside_of_root(self):
+        self.assertRaises(ValueError, uv_batch_headless.output_path,
+                          os.path.join("other", "scene.mb"), "out",
+                          "shots")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+'''
+Summary:
+make OpenMaya API edits undoable.
+
+API calls like MFnMesh.setUVs don't go on maya's undo queue. commit() runs
+an edit through a tiny command plug-in (this very file), so it becomes one
+regular undo step. Wrap several commits in an undo chunk to merge them.
+
+Usage:
+    api_undo.commit(undo=lambda: mesh_fn.setUVs(u_old, v_old),
+                    redo=lambda: mesh_fn.setUVs(u_new, v_new))
+'''
+
+import itertools
+import os
+from contextlib import contextmanager
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+
+CMD_NAME = "txApiUndo"
+
+# edits waiting to be picked up by the next command call
+_pending = []
+# keeps undo chunk names unique
+_chunk_ids = itertools.count()
+
+
+def maya_useNewAPI():
+    """
+    Tell maya this plug-in uses the python API 2.0
+    """
+    pass
+
+
+class ApiUndoCommand(om2.MPxCommand):
+
+    def __init__(self):
+        super(ApiUndoCommand, self).__init__()
+        self.undo = None
+        self.redo = None
+
+    @staticmethod
+    def creator():
+        return ApiUndoCommand()
+
+    def doIt(self, args):
+        # maya imports the plug-in as its own module, go through the
+        # package module so both sides share the same queue
+        from txmaya.general import api_undo
+        self.undo, self.redo = api_undo._pending.pop(0)
+        self.redo()
+
+    def undoIt(self):
+        self.undo()
+
+    def redoIt(self):
+        self.redo()
+
+    def isUndoable(self):
+        return True
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin).registerCommand(CMD_NAME, ApiUndoCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(CMD_NAME)
+
+
+def load():
+    """
+    Load this file as a plug-in once per session
+    """
+    if not hasattr(mc, CMD_NAME):
+        # maya loads plug-ins from source files only
+        path_plugin = os.path.splitext(__file__)[0] + ".py"
+        mc.loadPlugin(path_plugin, quiet=True)
+
+
+def commit(undo, redo):
+    """
+    Run redo() now as one undoable command, undo() reverts it
+    """
+    load()
+    _pending.append((undo, redo))
+    getattr(mc, CMD_NAME)()
+
+
+@contextmanager
+def undo_chunk(name="txUndoChunk", rollback=True):
+    """
+    Group everything done inside into one undo step. With rollback, an
+    error inside undoes the partial step before being raised again
+    """
+    chunk_name = "{0}_{1}".format(name, next(_chunk_ids))
+    mc.undoInfo(openChunk=True, chunkName=chunk_name)
+    try:
+        yield
+    except Exception:
+        mc.undoInfo(closeChunk=True)
+        # an empty chunk isn't queued, don't undo the step before it
+        if rollback and mc.undoInfo(q=True, undoName=True) == chunk_name:
+            mc.undo()
+        raise
+    mc.undoInfo(closeChunk=True)
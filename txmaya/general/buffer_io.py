@@ -0,0 +1,207 @@
+'''
+Summary:
+disk side of tx File Buffer: streamed copies, compression and atomic moves.
+
+Compression streams chunk by chunk in both directions, a payload is never
+held in memory as a whole. zlib always works, lzma and zstd when python
+has them (lzma from python 3 or backports.lzma, zstd from zstandard).
+
+File Buffer runs these copies on a worker thread while maya keeps the
+main one.
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# bytes read and written at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+# file extension added by every codec
+DICT_CODEC_EXT = {"zlib": ".zz", "lzma": ".xz", "zstd": ".zst"}
+
+
+def list_codecs():
+    """
+    Return the names of the codecs this python can stream
+    """
+    list_codec = ["zlib"]
+    if lzma is not None:
+        list_codec.append("lzma")
+    if zstandard is not None:
+        list_codec.append("zstd")
+    return list_codec
+
+
+class _Passthrough(object):
+
+    def compress(self, chunk):
+        return chunk
+
+    decompress = compress
+
+    def flush(self):
+        return b""
+
+
+class _StreamDecompressor(object):
+
+    # lzma's and older zstandard's decompressors have no flush(), nothing
+    # is held back at the end of their streams anyway
+    def __init__(self, decompressor):
+        self.decompressor = decompressor
+
+    def decompress(self, chunk):
+        return self.decompressor.decompress(chunk)
+
+    def flush(self):
+        return b""
+
+
+def make_compressor(codec=None):
+    """
+    Return a streaming compressor: compress(chunk), then flush() once
+    """
+    if codec is None:
+        return _Passthrough()
+    if codec == "zlib":
+        return zlib.compressobj(6)
+    if codec == "lzma" and lzma is not None:
+        return lzma.LZMACompressor(preset=1)
+    if codec == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError("Codec not available: {0}".format(codec))
+
+
+def make_decompressor(codec=None):
+    """
+    Return a streaming decompressor: decompress(chunk), then flush() once
+    """
+    if codec is None:
+        return _Passthrough()
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "lzma" and lzma is not None:
+        return _StreamDecompressor(lzma.LZMADecompressor())
+    if codec == "zstd" and zstandard is not None:
+        return _StreamDecompressor(
+            zstandard.ZstdDecompressor().decompressobj())
+    raise ValueError("Codec not available: {0}".format(codec))
+
+
+def temp_path(path_file):
+    """
+    Return a hidden, unique temp path next to path_file, on the same
+    file system so it can be moved into place atomically
+    """
+    dir_file, name = os.path.split(path_file)
+    return os.path.join(dir_file, ".{0}.{1}.tmp".format(name,
+                                                        uuid.uuid4().hex))
+
+
+def atomic_move(path_src, path_dst):
+    """
+    Move path_src onto path_dst in one step, replacing it: readers see
+    the old file or the new one, never half of it
+    """
+    if hasattr(os, "replace"):
+        os.replace(path_src, path_dst)
+        return
+    try:
+        os.rename(path_src, path_dst)
+    except OSError:
+        # python 2 on windows can't rename onto an existing file
+        if not os.path.exists(path_dst):
+            raise
+        os.remove(path_dst)
+        os.rename(path_src, path_dst)
+
+
+def copy_file(path_src, path_dst, chunk_size=CHUNK_SIZE, on_progress=None,
+              hasher=None, compress=None, decompress=None):
+    """
+    Copy path_src to path_dst in chunks through a temp file, then move it
+    into place. on_progress(num bytes read, num bytes total) is called
+    after every chunk, hasher (a hashlib object) sees every written chunk.
+    compress / decompress: codec names (see list_codecs) applied on the
+    way. Return the number of bytes written
+    """
+    num_total = os.path.getsize(path_src)
+    path_temp = temp_path(path_dst)
+    if compress is not None:
+        coder = make_compressor(compress)
+        code = coder.compress
+    else:
+        coder = make_decompressor(decompress)
+        code = coder.decompress
+    num_read = 0
+    num_written = 0
+    try:
+        with open(path_src, "rb") as f_src:
+            with open(path_temp, "wb") as f_dst:
+
+                def write(data):
+                    if data:
+                        f_dst.write(data)
+                        if hasher is not None:
+                            hasher.update(data)
+                    return len(data)
+
+                while True:
+                    chunk = f_src.read(chunk_size)
+                    if not chunk:
+                        break
+                    num_read += len(chunk)
+                    num_written += write(code(chunk))
+                    if on_progress is not None:
+                        on_progress(num_read, num_total)
+                num_written += write(coder.flush())
+                f_dst.flush()
+                os.fsync(f_dst.fileno())
+        atomic_move(path_temp, path_dst)
+    except Exception:
+        if os.path.exists(path_temp):
+            os.remove(path_temp)
+        raise
+    return num_written
+
+
+def write_json_atomic(path_file, data):
+    """
+    Write data as json through a temp file moved into place
+    """
+    path_temp = temp_path(path_file)
+    try:
+        with open(path_temp, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        atomic_move(path_temp, path_file)
+    except Exception:
+        if os.path.exists(path_temp):
+            os.remove(path_temp)
+        raise
+
+
+def make_temp_dir():
+    """
+    Return a new local temp directory for one export
+    """
+    return tempfile.mkdtemp(prefix="txFileBuffer_")
+
+
+def remove_temp_dir(path_dir):
+    shutil.rmtree(path_dir, ignore_errors=True)
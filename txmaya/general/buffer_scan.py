@@ -0,0 +1,170 @@
+'''
+Summary:
+disk accounting of tx File Buffer: which buffer files a directory holds
+and how big they are.
+
+Only the top level of the buffer directory is listed, with scandir, and
+only names of the buffer's own files (fileBufferTemp*, the index) are
+stat'ed, so a buffer directory inside a big project costs one listing,
+not a walk of the project. Listings are cached by the directory's mtime,
+and the tool's own exports and deletes update the cache in place.
+'''
+
+import os
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+from txmaya.general import buffer_store
+
+
+# every buffer file name starts with it: slots and older single files
+BUFFER_PREFIX = "fileBufferTemp"
+
+
+def is_buffer_file(name):
+    return (name.startswith(BUFFER_PREFIX)
+            or name == buffer_store.INDEX_NAME)
+
+
+def dir_mtime(path_dir):
+    """
+    Return the mtime of path_dir, in ns where python has it
+    """
+    stat = os.stat(path_dir)
+    return getattr(stat, "st_mtime_ns", stat.st_mtime)
+
+
+def scan_dir(path_dir):
+    """
+    Return {name: size} of the buffer files at the top of path_dir
+    """
+    dict_size = {}
+    if scandir is None:
+        # python 2 without the scandir package
+        for name in os.listdir(path_dir):
+            if is_buffer_file(name):
+                path_file = os.path.join(path_dir, name)
+                if os.path.isfile(path_file):
+                    dict_size[name] = os.path.getsize(path_file)
+        return dict_size
+    iterator = scandir(path_dir)
+    try:
+        for entry in iterator:
+            if is_buffer_file(entry.name) and entry.is_file():
+                dict_size[entry.name] = entry.stat().st_size
+    finally:
+        # scandir iterators only have close() from python 3.6
+        if hasattr(iterator, "close"):
+            iterator.close()
+    return dict_size
+
+
+class BufferScanner(object):
+
+    """
+    Cached buffer file listings of any number of directories
+    """
+
+    def __init__(self):
+        self.cache = {}  # {path_dir: (mtime, {name: size})}
+
+    def files(self, path_dir):
+        """
+        Return {name: size} of the buffer files of path_dir, listed again
+        only when the directory changed since the last time
+        """
+        path_dir = os.path.normpath(path_dir)
+        mtime = dir_mtime(path_dir)
+        cached = self.cache.get(path_dir)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        dict_size = scan_dir(path_dir)
+        self.cache[path_dir] = (mtime, dict_size)
+        return dict_size
+
+    def total_size(self, path_dir):
+        return sum(self.files(path_dir).values())
+
+    def update(self, path_dir, list_name):
+        """
+        Stat again only the files of list_name, after this tool wrote or
+        removed them, instead of listing the directory again
+        """
+        path_dir = os.path.normpath(path_dir)
+        cached = self.cache.get(path_dir)
+        if cached is None:
+            return
+        dict_size = cached[1]
+        for name in list_name:
+            path_file = os.path.join(path_dir, name)
+            if os.path.isfile(path_file):
+                dict_size[name] = os.path.getsize(path_file)
+            else:
+                dict_size.pop(name, None)
+        self.cache[path_dir] = (dir_mtime(path_dir), dict_size)
+
+
+if __name__ == '__main__':
+    import shutil
+    import sys
+    import tempfile
+    import time
+
+    # a project root holding the buffer files, lots of its own files and
+    # subfolders: 1M files by default
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    num_top = min(num_files, 20000)
+    num_buffer = 500
+    path_root = tempfile.mkdtemp(prefix="txBufferScan_")
+    try:
+        time_start = time.time()
+        for i in range(num_buffer):
+            with open(os.path.join(path_root,
+                                   "fileBufferTemp_{0:016x}.mb".format(i)),
+                      "wb") as f:
+                f.write(b"0" * (i % 64))
+        for i in range(num_top):
+            open(os.path.join(path_root, "asset_{0}.ma".format(i)),
+                 "wb").close()
+        path_sub = None
+        for i in range(num_files - num_top):
+            if i % 10000 == 0:
+                path_sub = os.path.join(path_root, "sub_{0}".format(i))
+                os.mkdir(path_sub)
+            open(os.path.join(path_sub, "fileBufferTemp_{0}.ma".format(i)),
+                 "wb").close()
+        print("{0} files written in {1:.1f}s".format(
+            num_files + num_buffer, time.time() - time_start))
+
+        time_start = time.time()
+        size_walk = 0
+        for root, dirs, files in os.walk(path_root):
+            for name in files:
+                if "fileBufferTemp" in name:
+                    size_walk += os.path.getsize(os.path.join(root, name))
+        print("os.walk: {0:.3f}s".format(time.time() - time_start))
+
+        scanner = BufferScanner()
+        time_start = time.time()
+        size_scan = scanner.total_size(path_root)
+        print("scan: {0:.3f}s".format(time.time() - time_start))
+        time_start = time.time()
+        for i in range(100):
+            scanner.total_size(path_root)
+        print("cached: {0:.6f}s".format((time.time() - time_start) / 100))
+        name = "fileBufferTemp_{0:016x}.mb".format(num_buffer)
+        with open(os.path.join(path_root, name), "wb") as f:
+            f.write(b"0" * 1000)
+        time_start = time.time()
+        scanner.update(path_root, [name])
+        print("incremental: {0:.6f}s".format(time.time() - time_start))
+        assert scanner.total_size(path_root) == size_scan + 1000
+        assert scan_dir(path_root) == scanner.files(path_root)
+    finally:
+        shutil.rmtree(path_root, ignore_errors=True)
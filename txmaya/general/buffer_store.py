@@ -0,0 +1,172 @@
+'''
+Summary:
+content-addressed, multi-slot buffer store of tx File Buffer.
+
+Every payload lives in its own slot file named after its content key,
+fileBufferTemp_<key>.<ext>[.<codec ext>], next to an index file
+(fileBufferIndex.json) holding each slot's metadata: source scene, nodes,
+format, codec, sizes, sha1 and times. Sizes and listings are read from
+the index, the directory is never walked. Once over the disk quota, the
+least recently used slots go first.
+
+Index writes go through a temp file moved into place, and the index is
+read again before every change, so several mayas can share one folder.
+'''
+
+import hashlib
+import json
+import os
+import time
+
+from txmaya.general import buffer_io
+
+
+INDEX_NAME = "fileBufferIndex.json"
+SLOT_PREFIX = "fileBufferTemp_"
+INDEX_VERSION = 1
+
+
+class BufferStore(object):
+
+    """
+    Slots of one buffer directory. quota: max bytes of all slots,
+    None for no limit
+    """
+
+    def __init__(self, path_dir, quota=None):
+        self.path_dir = path_dir
+        self.quota = quota
+        self.path_index = os.path.join(path_dir, INDEX_NAME)
+        self.slots = {}  # {key: metadata dict}
+
+    def load(self):
+        """
+        Read the index again, a missing or broken one is an empty store
+        """
+        self.slots = {}
+        if not os.path.isfile(self.path_index):
+            return self.slots
+        try:
+            with open(self.path_index) as f:
+                data = json.load(f)
+        except ValueError:
+            return self.slots
+        if data.get("version") == INDEX_VERSION:
+            self.slots = data.get("slots", {})
+        return self.slots
+
+    def save(self):
+        buffer_io.write_json_atomic(self.path_index,
+                                    {"version": INDEX_VERSION,
+                                     "slots": self.slots})
+
+    def slot_path(self, key):
+        return os.path.join(self.path_dir, self.slots[key]["file"])
+
+    def has(self, key):
+        """
+        Return whether key has a slot whose file is still there
+        """
+        self.load()
+        return key in self.slots and os.path.isfile(self.slot_path(key))
+
+    def list_slots(self):
+        """
+        Return [(key, metadata), ...], most recently used first
+        """
+        self.load()
+        return sorted(self.slots.items(),
+                      key=lambda i: i[1]["last_used"],
+                      reverse=True)
+
+    def add(self, key, path_src, metadata, on_progress=None, codec=None):
+        """
+        Copy path_src into the slot of key, compressed with codec (see
+        buffer_io.list_codecs) if any, and record it with metadata
+        (source scene, nodes, format, ...), then evict over the quota.
+        Return the slot's metadata
+        """
+        ext = os.path.splitext(path_src)[1]
+        ext += buffer_io.DICT_CODEC_EXT.get(codec, "")
+        name = SLOT_PREFIX + key + ext
+        hasher = hashlib.sha1()
+        time_start = time.time()
+        size = buffer_io.copy_file(path_src,
+                                   os.path.join(self.path_dir, name),
+                                   on_progress=on_progress,
+                                   hasher=hasher,
+                                   compress=codec)
+        time_now = time.time()
+        slot = dict(metadata)
+        slot.update({"file": name,
+                     "size": size,
+                     "raw_size": os.path.getsize(path_src),
+                     "codec": codec,
+                     "sha1": hasher.hexdigest(),
+                     "seconds_write": time_now - time_start,
+                     "created": time_now,
+                     "last_used": time_now})
+        self.load()
+        self.slots[key] = slot
+        self.evict(keep=key)
+        self.save()
+        return slot
+
+    def extract(self, key, path_dst, on_progress=None):
+        """
+        Write the payload of a slot, decompressed, to path_dst.
+        Return the number of bytes written
+        """
+        self.load()
+        return buffer_io.copy_file(self.slot_path(key),
+                                   path_dst,
+                                   on_progress=on_progress,
+                                   decompress=self.slots[key].get("codec"))
+
+    def touch(self, key):
+        """
+        Mark a slot as just used
+        """
+        self.load()
+        if key in self.slots:
+            self.slots[key]["last_used"] = time.time()
+            self.save()
+
+    def clear(self):
+        """
+        Remove every slot and the index itself
+        """
+        self.load()
+        for key in list(self.slots):
+            self._remove_slot(key)
+        if os.path.isfile(self.path_index):
+            os.remove(self.path_index)
+
+    def evict(self, keep=None):
+        """
+        Drop least recently used slots until the store fits the quota,
+        never the slot of keep. Return the evicted keys.
+        Works on the loaded index, the caller saves
+        """
+        list_evicted = []
+        if self.quota is None:
+            return list_evicted
+        total = sum(i["size"] for i in self.slots.values())
+        for key, slot in sorted(self.slots.items(),
+                                key=lambda i: i[1]["last_used"]):
+            if total <= self.quota:
+                break
+            if key == keep:
+                continue
+            total -= slot["size"]
+            self._remove_slot(key)
+            list_evicted.append(key)
+        return list_evicted
+
+    def _remove_slot(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        path_file = os.path.join(self.path_dir, slot["file"])
+        if os.path.isfile(path_file):
+            os.remove(path_file)
@@ -0,0 +1,81 @@
+'''
+Summary:
+run long batches in chunks, with progress, ETA and cancel in between.
+
+Each chunk runs inside chunk_context() (e.g. an undo chunk that rolls
+itself back on error), so a cancel or a failure never leaves a half-done
+chunk behind: everything finished before it stays as is.
+'''
+
+import time
+from collections import namedtuple
+
+
+JobResult = namedtuple("JobResult", ["num_done",
+                                     "num_total",
+                                     "cancelled",
+                                     "error",
+                                     "seconds"])
+
+
+class ChunkedJob(object):
+
+    def __init__(self, items, process_item, chunk_size=100,
+                 chunk_context=None):
+        """
+        items: list of work items, process_item(item) does one of them.
+        chunk_context: callable returning a context manager wrapped
+        around every chunk
+        """
+        self.items = list(items)
+        self.process_item = process_item
+        self.chunk_size = max(1, int(chunk_size))
+        self.chunk_context = chunk_context
+
+    def chunks(self):
+        for start in range(0, len(self.items), self.chunk_size):
+            yield self.items[start:start + self.chunk_size]
+
+    def run_chunk(self, chunk):
+        if self.chunk_context is None:
+            for item in chunk:
+                self.process_item(item)
+        else:
+            with self.chunk_context():
+                for item in chunk:
+                    self.process_item(item)
+
+    def run(self, on_progress=None, is_cancelled=None):
+        """
+        Run every chunk in order.
+        on_progress(num done, num total, items per second, eta seconds)
+        is called after each chunk, is_cancelled() is asked before each.
+        A failing chunk stops the job, its error is in the result.
+        """
+        num_total = len(self.items)
+        num_done = 0
+        time_start = time.time()
+        for chunk in self.chunks():
+            if is_cancelled is not None and is_cancelled():
+                return JobResult(num_done, num_total, True, None,
+                                 time.time() - time_start)
+            try:
+                self.run_chunk(chunk)
+            except Exception as e:
+                return JobResult(num_done, num_total, False, e,
+                                 time.time() - time_start)
+            num_done += len(chunk)
+            if on_progress is not None:
+                on_progress(*progress(num_done, num_total,
+                                      time.time() - time_start))
+        return JobResult(num_done, num_total, False, None,
+                         time.time() - time_start)
+
+
+def progress(num_done, num_total, seconds):
+    """
+    Return (num done, num total, items per second, eta seconds)
+    """
+    rate = num_done / seconds if seconds > 0 else 0.0
+    eta = (num_total - num_done) / rate if rate > 0 else 0.0
+    return num_done, num_total, rate, eta
@@ -1,26 +1,34 @@
+import datetime
+import hashlib
 import os
+import time
+import uuid
 
 import maya.cmds as mc
 import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
+import maya.api.OpenMaya as om2
 
 from PySide2 import QtGui
 from PySide2 import QtCore
 from PySide2 import QtWidgets
 from shiboken2 import wrapInstance
 
+from txmaya.general import api_undo
+from txmaya.general import buffer_io
+from txmaya.general import buffer_scan
+from txmaya.general import buffer_store
+from txmaya.general import lazy_module
+from txmaya.general import plugin_loader
+
+# numpy and the engines load on first use
+np = lazy_module.LazyModule("numpy")
+mesh_arrays = lazy_module.LazyModule("txmaya.modeling.mesh_arrays")
+obj_codec = lazy_module.LazyModule("txmaya.general.obj_codec")
+
 __author__ = "Xiaowei Oscar Tan"
 __version__ = '2.0.0'
 
-# Load plug-ins
-list_plugins = ['AbcExport.so',
-                'AbcImport.so',
-                'objExport.so',
-                'fbxmaya.so']
-for i in list_plugins:
-    if not mc.pluginInfo(i, q=True, loaded=True):
-        mc.loadPlugin(i)
-
 
 def maya_main_window():
     """
@@ -31,8 +39,40 @@ def maya_main_window():
         return wrapInstance(long(maya_main_ptr), QtWidgets.QWidget)
 
 
+class BufferWorker(QtCore.QThread):
+
+    """
+    Run job(on_progress) off the main thread and report through signals.
+    Jobs only touch the disk, maya commands must stay on the main thread
+    """
+
+    # bytes done, bytes total. objects: sizes can overflow a C int
+    progress = QtCore.Signal(object, object)
+    succeeded = QtCore.Signal(dict)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, job, parent=None):
+        super(BufferWorker, self).__init__(parent)
+        self.job = job
+
+    def run(self):
+        try:
+            result = self.job(self.progress.emit)
+        except Exception as e:
+            self.failed.emit("{0}: {1}".format(type(e).__name__, e))
+            return
+        self.succeeded.emit(result)
+
+
 class FileBuffer(QtWidgets.QDialog):
 
+    # file extension of every format radio id
+    DICT_EXT = {0: "mb", 1: "ma", 2: "abc", 3: "fbx", 4: "obj",
+                5: "obj_fast"}
+    # formats whose selection key covers everything they write, an
+    # export of an already buffered key is skipped
+    LIST_EXT_KEYED = ["obj_fast"]
+
     dialog_instance = None
 
     @classmethod
@@ -57,6 +97,10 @@ class FileBuffer(QtWidgets.QDialog):
                             ^ QtCore.Qt.WindowContextHelpButtonHint)
         # ui position
         self.geometry = None
+        # background job writing the last export
+        self.worker = None
+        # cached sizes of the buffer files on disk
+        self.scanner = buffer_scan.BufferScanner()
         # widgets and layouts
         self.create_widgets()
         self.create_layouts()
@@ -70,6 +114,23 @@ class FileBuffer(QtWidgets.QDialog):
         self.label_buffer_size = QtWidgets.QLabel("Buffer Files Size: ")
         self.label_anim_keep = QtWidgets.QLabel("Preserve Anim:")
         self.label_anim_no = QtWidgets.QLabel("Delete Anim:")
+        self.label_slot = QtWidgets.QLabel("Buffer Slot:")
+        self.label_quota = QtWidgets.QLabel("Disk Quota:")
+        self.label_codec = QtWidgets.QLabel("Compression:")
+
+        self.combo_slot = QtWidgets.QComboBox()
+        self.combo_slot.setSizeAdjustPolicy(
+            QtWidgets.QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.spin_quota = QtWidgets.QDoubleSpinBox()
+        self.spin_quota.setRange(0.0, 100000.0)
+        self.spin_quota.setSuffix(" GB")
+        self.spin_quota.setSpecialValueText("Unlimited")
+        self.spin_quota.setToolTip("Least recently used slots are removed "
+                                   "over this size")
+        self.combo_codec = QtWidgets.QComboBox()
+        self.combo_codec.addItem("None", None)
+        for codec in buffer_io.list_codecs():
+            self.combo_codec.addItem(codec, codec)
 
         self.text_buffer = QtWidgets.QLabel("--")
         self.text_buffer.setTextFormat(QtCore.Qt.RichText)
@@ -82,6 +143,9 @@ class FileBuffer(QtWidgets.QDialog):
         self.radio_abc = QtWidgets.QRadioButton("abc")
         self.radio_fbx = QtWidgets.QRadioButton("fbx")
         self.radio_obj = QtWidgets.QRadioButton("obj")
+        self.radio_obj_fast = QtWidgets.QRadioButton("obj (fast)")
+        self.radio_obj_fast.setToolTip("Geometry only: points, faces, "
+                                       "current uvs and normals")
 
         self.radio_grp = QtWidgets.QButtonGroup()
         self.radio_grp.addButton(self.radio_mb)
@@ -89,11 +153,13 @@ class FileBuffer(QtWidgets.QDialog):
         self.radio_grp.addButton(self.radio_abc)
         self.radio_grp.addButton(self.radio_fbx)
         self.radio_grp.addButton(self.radio_obj)
+        self.radio_grp.addButton(self.radio_obj_fast)
         self.radio_grp.setId(self.radio_mb, 0)
         self.radio_grp.setId(self.radio_ma, 1)
         self.radio_grp.setId(self.radio_abc, 2)
         self.radio_grp.setId(self.radio_fbx, 3)
         self.radio_grp.setId(self.radio_obj, 4)
+        self.radio_grp.setId(self.radio_obj_fast, 5)
 
         self.btn_file_browser = QtWidgets.QPushButton()
         self.btn_file_browser.setIcon(QtGui.QIcon(":fileOpen.png"))
@@ -102,6 +168,10 @@ class FileBuffer(QtWidgets.QDialog):
         self.btn_export = QtWidgets.QPushButton("Export Selection to Buffer")
         self.btn_import = QtWidgets.QPushButton("Import Buffer")
 
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+
     def create_layouts(self):
         layout_line_edit = QtWidgets.QHBoxLayout()
         layout_line_edit.addWidget(self.line_edit)
@@ -125,6 +195,7 @@ class FileBuffer(QtWidgets.QDialog):
         layout_radio_anim_no.addWidget(self.radio_abc, 0, 0, 1)
         layout_radio_anim_no.addWidget(self.radio_fbx, 0, 1, 1)
         layout_radio_anim_no.addWidget(self.radio_obj, 0, 2, 1)
+        layout_radio_anim_no.addWidget(self.radio_obj_fast, 1, 2, 1)
 
         layout_btn_io = QtWidgets.QHBoxLayout()
         layout_btn_io.addStretch()
@@ -135,11 +206,15 @@ class FileBuffer(QtWidgets.QDialog):
         layout_form.addRow(self.label_dir, layout_line_edit)
         layout_form.addRow(self.label_buffer_size, layout_buffer_check)
         layout_form.addRow("", layout_buffer_clear)
+        layout_form.addRow(self.label_slot, self.combo_slot)
+        layout_form.addRow(self.label_quota, self.spin_quota)
+        layout_form.addRow(self.label_codec, self.combo_codec)
         layout_form.addRow(self.label_anim_keep, layout_radio_anim_keep)
         layout_form.addRow(self.label_anim_no, layout_radio_anim_no)
 
         layout_root = QtWidgets.QVBoxLayout(self)
         layout_root.addLayout(layout_form)
+        layout_root.addWidget(self.progress_bar)
         layout_root.addLayout(layout_btn_io)
 
     # signals and slots
@@ -174,8 +249,10 @@ class FileBuffer(QtWidgets.QDialog):
                         file_name,
                         file_ext,
                         type,
-                        options):
-        list_sel = mc.ls(sl=True) or []
+                        options,
+                        list_sel=None):
+        if list_sel is None:
+            list_sel = mc.ls(sl=True) or []
         path_full = os.path.join(file_dir, '.'.join((file_name, file_ext)))
         if len(list_sel) == 0:
             return
@@ -193,8 +270,10 @@ class FileBuffer(QtWidgets.QDialog):
                             file_name,
                             file_ext,
                             frame_start,
-                            frame_end):
-        list_sel = mc.ls(sl=True) or []
+                            frame_end,
+                            list_sel=None):
+        if list_sel is None:
+            list_sel = mc.ls(sl=True) or []
         # cmd_frame_range
         cmd_frame_range = " ".join(("-frameRange",
                                     str(frame_start),
@@ -247,6 +326,58 @@ class FileBuffer(QtWidgets.QDialog):
         else:
             return
 
+    def obj_export_sel(self, file_dir, file_name, file_ext, list_sel):
+
+        """
+        write the meshes under list_sel into an obj file, straight from
+        their arrays: world space points, faces, current uvs and normals
+        """
+
+        list_mesh = []
+        for shape in mc.ls(list_sel, dag=True, type="mesh",
+                           noIntermediate=True, long=True) or []:
+            mesh_fn = mesh_arrays.get_mesh_fn(shape)
+            face_counts, face_vertices = mesh_arrays.get_face_vertices(
+                mesh_fn)
+            normals, face_normals = mesh_arrays.get_normals(mesh_fn)
+            mesh = obj_codec.ObjMesh(shape.split("|")[-2],
+                                     mesh_arrays.get_points(mesh_fn),
+                                     face_counts,
+                                     face_vertices,
+                                     normals=normals,
+                                     face_normals=face_normals)
+            u, v = mesh_arrays.get_uvs(mesh_fn)
+            uv_counts, face_uvs = mesh_arrays.get_assigned_uvs(mesh_fn)
+            # a face-vertex without uv can't be written in obj
+            if len(u) and (uv_counts == face_counts).all():
+                mesh.uvs = np.column_stack((u, v))
+                mesh.face_uvs = face_uvs
+            list_mesh.append(mesh)
+        if not list_mesh:
+            return
+        path_full = os.path.join(file_dir, '.'.join((file_name, file_ext)))
+        obj_codec.write_obj(path_full, list_mesh)
+        return path_full
+
+    def obj_import(self, file_dir, file_name, file_ext):
+
+        """ create the meshes of an obj file straight from its arrays """
+
+        path_full = os.path.join(file_dir, '.'.join((file_name, file_ext)))
+        if not os.path.isfile(path_full):
+            return
+        with api_undo.undo_chunk("txFileBufferImport"):
+            for mesh in obj_codec.read_obj(path_full):
+                mesh_arrays.create_mesh(mesh.name,
+                                        mesh.points,
+                                        mesh.face_counts,
+                                        mesh.face_vertices,
+                                        mesh.uvs,
+                                        mesh.face_uvs,
+                                        mesh.normals,
+                                        mesh.face_normals)
+        return path_full
+
     # special
     def show_file_browser(self):
         path_dir = QtWidgets.QFileDialog.getExistingDirectory(self,
@@ -254,17 +385,17 @@ class FileBuffer(QtWidgets.QDialog):
         if path_dir:
             self.line_edit.setText(path_dir)
 
+    def get_store(self, path_dir):
+        quota = self.spin_quota.value()
+        return buffer_store.BufferStore(
+            path_dir,
+            quota=int(quota * 2 ** 30) if quota else None)
+
     def get_buffer_size(self):
         path_dir = self.line_edit.text()
         file_info = QtCore.QFileInfo(path_dir)
         if file_info.exists():
-            buffer_size = 0
-            for root, dirs, files in os.walk(path_dir):
-                for name in files:
-                    if "fileBufferTemp" in name:
-                        path_full = os.path.join(root, name)
-                        buffer_size += self.get_file_size(path_full)
-            return buffer_size
+            return self.scanner.total_size(path_dir)
         else:
             return
 
@@ -287,20 +418,46 @@ class FileBuffer(QtWidgets.QDialog):
                                          + "</b>")
             else:
                 self.text_buffer.setText("<b>0 KB</b>")
+        self.display_slots()
+
+    def display_slots(self):
+        path_dir = self.line_edit.text()
+        self.combo_slot.clear()
+        if not path_dir or not QtCore.QFileInfo(path_dir).exists():
+            return
+        for key, slot in self.get_store(path_dir).list_slots():
+            size = self.byte_convert(slot["size"])
+            time_used = datetime.datetime.fromtimestamp(slot["last_used"])
+            text = "{0}{1}  {2}{3}  {4}  {5}".format(
+                slot["format"],
+                "." + slot["codec"] if slot.get("codec") else "",
+                size[0],
+                size[1],
+                time_used.strftime("%m-%d %H:%M"),
+                os.path.basename(slot["scene"]) or "untitled")
+            self.combo_slot.addItem(text, key)
+            self.combo_slot.setItemData(self.combo_slot.count() - 1,
+                                        "\n".join(slot["nodes"][:20]),
+                                        QtCore.Qt.ToolTipRole)
 
     def delete_buffer(self):
         path_dir = self.line_edit.text()
-        for root, dirs, files in os.walk(path_dir):
-            for name in files:
-                if "fileBufferTemp" in name:
-                    path_full = os.path.join(root, name)
-                    os.remove(path_full)
+        if not path_dir or not QtCore.QFileInfo(path_dir).exists():
+            self.display_buffer_size()
+            return
+        list_name = list(self.scanner.files(path_dir))
+        self.get_store(path_dir).clear()
+        # files of older versions, kept out of the index
+        for name in list_name:
+            path_full = os.path.join(path_dir, name)
+            if os.path.isfile(path_full):
+                os.remove(path_full)
+        self.scanner.update(path_dir, list_name)
         self.display_buffer_size()
 
     def apply_export(self):
         path_dir = self.line_edit.text()
         info_dir = QtCore.QFileInfo(path_dir)
-        file_name = "fileBufferTemp"
         radio_id = self.radio_grp.checkedId()
         if not path_dir:
             self.text_buffer.setText("<b><i>Directory not exists!</i></b>")
@@ -308,92 +465,330 @@ class FileBuffer(QtWidgets.QDialog):
         elif not info_dir.exists():
             self.text_buffer.setText("<b><i>Directory not exists!</i></b>")
             return
-        else:
-            if radio_id == 0:
-                out_path = self.file_export_sel(file_dir=path_dir,
-                                                file_name=file_name,
-                                                file_ext="mb",
-                                                type="mayaBinary",
-                                                options="v=0;")
-            if radio_id == 1:
-                out_path = self.file_export_sel(file_dir=path_dir,
-                                                file_name=file_name,
-                                                file_ext="ma",
-                                                type="mayaAscii",
-                                                options="v=0;")
-            if radio_id == 2:
-                frame_current = mc.currentTime(query=True)
-                out_path = self.file_export_sel_abc(file_dir=path_dir,
-                                                    file_name=file_name,
-                                                    file_ext="abc",
-                                                    frame_start=frame_current,
-                                                    frame_end=frame_current)
-            if radio_id == 3:
-                out_path = self.file_export_sel(file_dir=path_dir,
-                                                file_name=file_name,
-                                                file_ext="fbx",
-                                                type="FBX export",
-                                                options="v=0;p=17;f=0")
-            if radio_id == 4:
-                out_path = self.file_export_sel(file_dir=path_dir,
-                                                file_name=file_name,
-                                                file_ext="obj",
-                                                type="OBJexport",
-                                                options="groups=0;"
-                                                        "ptgroups=1;"
-                                                        "materials=0;"
-                                                        "smoothing=1;"
-                                                        "normals=1;")
-        self.display_buffer_size()
-        if out_path is None:
+        if self.worker is not None and self.worker.isRunning():
+            om.MGlobal.displayWarning("Previous buffer is still being "
+                                      "written!")
+            return
+        # snapshot the selection, changes during the export don't matter
+        list_sel = mc.ls(sl=True, long=True) or []
+        if not list_sel:
             om.MGlobal.displayWarning("Nothing Selected!")
+            return
+        # the same content in the same format is already there. Other
+        # formats also write animation, shading, non-mesh shapes... that
+        # the key doesn't see, they always export into a new slot without
+        # hashing the selection
+        ext = self.DICT_EXT[radio_id]
+        store = self.get_store(path_dir)
+        if ext not in self.LIST_EXT_KEYED:
+            key = uuid.uuid4().hex[:16]
         else:
-            out_size_byte = self.get_file_size(out_path)
-            out_size = self.byte_convert(out_size_byte)
-            info = "{2}  {0}{1}.".format(str(out_size[0]),
-                                         out_size[1],
-                                         "Buffer exported successfully:")
-            om.MGlobal.displayInfo(info)
+            key = self.get_selection_key(list_sel, ext)
+        if store.has(key):
+            store.touch(key)
+            self.scanner.update(path_dir, [buffer_store.INDEX_NAME])
+            self.display_buffer_size()
+            om.MGlobal.displayInfo("Selection already buffered, "
+                                   "export skipped.")
+            return
+        metadata = {"scene": mc.file(q=True, sceneName=True) or "",
+                    "nodes": list_sel,
+                    "format": ext}
+        codec = self.combo_codec.currentData()
+        # maya writes to a local temp file, the rest happens in the back
+        dir_temp = buffer_io.make_temp_dir()
+        try:
+            path_local = self.export_format(radio_id, dir_temp, list_sel)
+        except Exception:
+            buffer_io.remove_temp_dir(dir_temp)
+            raise
+        # obj (fast) only writes meshes
+        if path_local is None:
+            buffer_io.remove_temp_dir(dir_temp)
+            om.MGlobal.displayWarning("Nothing to export in this format!")
+            return
 
-    def apply_import(self):
-        path_dir = self.line_edit.text()
+        def job(on_progress):
+            time_start = time.time()
+            set_before = set(i["file"] for i in store.load().values())
+            try:
+                slot = store.add(key, path_local, metadata, on_progress,
+                                 codec)
+            finally:
+                buffer_io.remove_temp_dir(dir_temp)
+            # the new slot, evicted slots and the index changed on disk
+            set_after = set(i["file"] for i in store.slots.values())
+            list_changed = list(set_before ^ set_after)
+            list_changed.append(buffer_store.INDEX_NAME)
+            return {"dir": path_dir,
+                    "changed": list_changed,
+                    "path": store.slot_path(key),
+                    "size": slot["size"],
+                    "raw_size": slot["raw_size"],
+                    "codec": codec,
+                    "seconds": time.time() - time_start}
+
+        self.start_worker(job)
+
+    def get_selection_key(self, list_sel, ext):
+
+        """
+        return a hash of list_sel: the format, the nodes, their world
+        matrices and mesh data (points, faces, uvs, normals). That's all
+        an obj (fast) export holds, other formats hold more
+        """
+
+        hasher = hashlib.sha1()
+        hasher.update(ext.encode("utf-8"))
+        list_dag = mc.ls(list_sel, dag=True, long=True) or []
+        for i in sorted(set(list_sel) - set(list_dag)):
+            hasher.update(i.encode("utf-8"))
+        sel = om2.MSelectionList()
+        for i in list_dag:
+            sel.add(i)
+        for i in range(sel.length()):
+            dag_path = sel.getDagPath(i)
+            hasher.update(dag_path.fullPathName().encode("utf-8"))
+            hasher.update(str(list(dag_path.inclusiveMatrix()))
+                          .encode("utf-8"))
+            if dag_path.apiType() != om2.MFn.kMesh:
+                continue
+            mesh_fn = om2.MFnMesh(dag_path)
+            hasher.update(mesh_arrays.get_points(mesh_fn,
+                                                 om2.MSpace.kObject)
+                          .tobytes())
+            for array in mesh_arrays.get_face_vertices(mesh_fn):
+                hasher.update(array.tobytes())
+            hasher.update(mesh_fn.currentUVSetName().encode("utf-8"))
+            for uv_set in mesh_fn.getUVSetNames():
+                hasher.update(uv_set.encode("utf-8"))
+                for array in mesh_arrays.get_uvs(mesh_fn, uv_set):
+                    hasher.update(array.tobytes())
+                for array in mesh_arrays.get_assigned_uvs(mesh_fn, uv_set):
+                    hasher.update(array.tobytes())
+            for array in mesh_arrays.get_normals(mesh_fn,
+                                                 om2.MSpace.kObject):
+                hasher.update(array.tobytes())
+        return hasher.hexdigest()[:16]
+
+    def export_format(self, radio_id, file_dir, list_sel):
+
+        """ export list_sel into file_dir with the chosen format """
+
+        plugin_loader.load_for_format(self.DICT_EXT[radio_id], "export")
         file_name = "fileBufferTemp"
-        radio_id = self.radio_grp.checkedId()
         if radio_id == 0:
-            in_file = self.file_import(file_dir=path_dir,
-                                       file_name=file_name,
-                                       file_ext="mb",
-                                       type="mayaBinary",
-                                       options="v=0;p=17;f=0;")
+            return self.file_export_sel(file_dir=file_dir,
+                                        file_name=file_name,
+                                        file_ext="mb",
+                                        type="mayaBinary",
+                                        options="v=0;",
+                                        list_sel=list_sel)
         if radio_id == 1:
-            in_file = self.file_import(file_dir=path_dir,
-                                       file_name=file_name,
-                                       file_ext="ma",
-                                       type="mayaAscii",
-                                       options="v=0;p=17;f=0;")
+            return self.file_export_sel(file_dir=file_dir,
+                                        file_name=file_name,
+                                        file_ext="ma",
+                                        type="mayaAscii",
+                                        options="v=0;",
+                                        list_sel=list_sel)
         if radio_id == 2:
-            in_file = self.file_import(file_dir=path_dir,
-                                       file_name=file_name,
-                                       file_ext="abc",
-                                       type="Alembic",
-                                       options=None)
+            frame_current = mc.currentTime(query=True)
+            return self.file_export_sel_abc(file_dir=file_dir,
+                                            file_name=file_name,
+                                            file_ext="abc",
+                                            frame_start=frame_current,
+                                            frame_end=frame_current,
+                                            list_sel=list_sel)
         if radio_id == 3:
-            in_file = self.file_import(file_dir=path_dir,
-                                       file_name=file_name,
-                                       file_ext="fbx",
-                                       type="FBX",
-                                       options="fbx")
+            return self.file_export_sel(file_dir=file_dir,
+                                        file_name=file_name,
+                                        file_ext="fbx",
+                                        type="FBX export",
+                                        options="v=0;p=17;f=0",
+                                        list_sel=list_sel)
         if radio_id == 4:
-            in_file = self.file_import(file_dir=path_dir,
+            return self.file_export_sel(file_dir=file_dir,
+                                        file_name=file_name,
+                                        file_ext="obj",
+                                        type="OBJexport",
+                                        options="groups=0;"
+                                                "ptgroups=1;"
+                                                "materials=0;"
+                                                "smoothing=1;"
+                                                "normals=1;",
+                                        list_sel=list_sel)
+        if radio_id == 5:
+            return self.obj_export_sel(file_dir=file_dir,
                                        file_name=file_name,
                                        file_ext="obj",
-                                       type="OBJ",
-                                       options="mo=1;")
+                                       list_sel=list_sel)
+
+    def start_worker(self, job, on_succeeded=None, on_failed=None):
+        self.worker = BufferWorker(job, self)
+        self.worker.progress.connect(self.display_progress)
+        self.worker.succeeded.connect(on_succeeded
+                                      or self.on_export_succeeded)
+        self.worker.failed.connect(on_failed or self.on_export_failed)
+        self.btn_export.setEnabled(False)
+        self.btn_import.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.worker.start()
+
+    def display_progress(self, num_done, num_total):
+        if num_total:
+            self.progress_bar.setValue(int(100.0 * num_done / num_total))
+
+    def on_export_finished(self):
+        self.btn_export.setEnabled(True)
+        self.btn_import.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.display_buffer_size()
+
+    def on_export_succeeded(self, result):
+        self.scanner.update(result["dir"], result["changed"])
+        self.on_export_finished()
+        om.MGlobal.displayInfo("Buffer exported successfully: "
+                               + self.transfer_info(result))
+
+    def transfer_info(self, result):
+
+        """ return sizes, compression ratio and throughput of a transfer """
+
+        raw_size = self.byte_convert(result["raw_size"])
+        size = self.byte_convert(result["size"])
+        seconds = max(result["seconds"], 1e-6)
+        throughput = self.byte_convert(result["raw_size"] / seconds)
+        info = "{0}{1}".format(raw_size[0], raw_size[1])
+        if result.get("codec"):
+            info += " -> {0}{1} {2} ({3:.1%})".format(
+                size[0], size[1], result["codec"],
+                float(result["size"]) / max(result["raw_size"], 1))
+        return info + ", {0}{1}/s in {2:.1f}s.".format(throughput[0],
+                                                     throughput[1],
+                                                     seconds)
+
+    def on_export_failed(self, error):
+        self.on_export_finished()
+        om.MGlobal.displayError("Buffer export failed: " + error)
+
+    def apply_import(self):
+        path_dir = self.line_edit.text()
+        key = self.combo_slot.currentData()
+        if key:
+            store = self.get_store(path_dir)
+            if not store.has(key):
+                om.MGlobal.displayWarning("Buffer slot is gone!")
+                self.display_buffer_size()
+                return
+            store.touch(key)
+            slot = store.slots[key]
+            if slot.get("codec"):
+                self.import_compressed(store, key)
+                return
+            file_name = os.path.splitext(slot["file"])[0]
+            in_file = self.import_format(slot["format"], path_dir, file_name)
+        else:
+            # single buffer file of older versions
+            in_file = self.import_format(
+                self.DICT_EXT[self.radio_grp.checkedId()],
+                path_dir,
+                "fileBufferTemp")
         if in_file is None:
             om.MGlobal.displayWarning("Buffer file doesn't exist!")
         else:
             om.MGlobal.displayInfo("Buffer file imported successfully.")
 
+    def import_compressed(self, store, key):
+
+        """
+        decompress a slot into a local temp file in the back, then
+        import it
+        """
+
+        if self.worker is not None and self.worker.isRunning():
+            om.MGlobal.displayWarning("Previous buffer is still being "
+                                      "written!")
+            return
+        slot = store.slots[key]
+        dir_temp = buffer_io.make_temp_dir()
+        # the slot file without its codec extension
+        name_local = os.path.splitext(slot["file"])[0]
+        file_name = os.path.splitext(name_local)[0]
+        path_local = os.path.join(dir_temp, name_local)
+
+        def job(on_progress):
+            time_start = time.time()
+            store.extract(key, path_local, on_progress)
+            return {"dir_temp": dir_temp,
+                    "file_name": file_name,
+                    "format": slot["format"],
+                    "size": slot["size"],
+                    "raw_size": slot["raw_size"],
+                    "codec": slot["codec"],
+                    "seconds": time.time() - time_start}
+
+        def on_failed(error):
+            buffer_io.remove_temp_dir(dir_temp)
+            self.on_export_finished()
+            om.MGlobal.displayError("Buffer import failed: " + error)
+
+        self.start_worker(job, self.on_extract_succeeded, on_failed)
+
+    def on_extract_succeeded(self, result):
+        self.on_export_finished()
+        try:
+            in_file = self.import_format(result["format"],
+                                         result["dir_temp"],
+                                         result["file_name"])
+        finally:
+            buffer_io.remove_temp_dir(result["dir_temp"])
+        if in_file is None:
+            om.MGlobal.displayWarning("Buffer file doesn't exist!")
+        else:
+            om.MGlobal.displayInfo("Buffer file imported successfully: "
+                                   + self.transfer_info(result))
+
+    def import_format(self, ext, file_dir, file_name):
+
+        """ import a buffer file of the format matching ext """
+
+        plugin_loader.load_for_format(ext, "import")
+        if ext == "mb":
+            return self.file_import(file_dir=file_dir,
+                                    file_name=file_name,
+                                    file_ext="mb",
+                                    type="mayaBinary",
+                                    options="v=0;p=17;f=0;")
+        if ext == "ma":
+            return self.file_import(file_dir=file_dir,
+                                    file_name=file_name,
+                                    file_ext="ma",
+                                    type="mayaAscii",
+                                    options="v=0;p=17;f=0;")
+        if ext == "abc":
+            return self.file_import(file_dir=file_dir,
+                                    file_name=file_name,
+                                    file_ext="abc",
+                                    type="Alembic",
+                                    options=None)
+        if ext == "fbx":
+            return self.file_import(file_dir=file_dir,
+                                    file_name=file_name,
+                                    file_ext="fbx",
+                                    type="FBX",
+                                    options="fbx")
+        if ext == "obj":
+            return self.file_import(file_dir=file_dir,
+                                    file_name=file_name,
+                                    file_ext="obj",
+                                    type="OBJ",
+                                    options="mo=1;")
+        if ext == "obj_fast":
+            return self.obj_import(file_dir=file_dir,
+                                   file_name=file_name,
+                                   file_ext="obj")
+
     def showEvent(self, e):
         super(FileBuffer, self).showEvent(e)
 
@@ -405,6 +800,9 @@ class FileBuffer(QtWidgets.QDialog):
             super(FileBuffer, self).closeEvent(e)
 
             self.geometry = self.saveGeometry()
+            # let a running export land before the dialog goes
+            if self.worker is not None:
+                self.worker.wait()
 
 if __name__ == '__main__':
     # delete UI if there's one already open
@@ -0,0 +1,35 @@
+'''
+Summary:
+modules imported on first use.
+
+Tool modules bind heavy dependencies (numpy and the engines built on it)
+as LazyModule objects, so importing a tool, or maya loading a shelf,
+doesn't pay for them. The real import happens on the first attribute
+read, usually when the dialog does its first piece of work.
+
+Usage:
+    np = lazy_module.LazyModule("numpy")
+    mesh_arrays = lazy_module.LazyModule("txmaya.modeling.mesh_arrays")
+'''
+
+import importlib
+
+
+class LazyModule(object):
+
+    """
+    Stand-in for module name, imported when an attribute is first read
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # only called for attributes the stand-in doesn't have itself
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return "<lazy module '{0}'>".format(self._name)
@@ -0,0 +1,285 @@
+'''
+Summary:
+geometry-only OBJ writer and reader of tx File Buffer.
+
+Meshes go in and come out as flat arrays (points, vertex count per face,
+face-vertex indices, plus optional uvs and normals with their own
+face-vertex ids), ready for MFnMesh.create. Both ways work on blocks of
+lines: the writer formats a block of rows with one string operation, the
+reader sorts a block by line type and hands numbers to numpy in one call
+per type. Only v, vt, vn, f and o / g lines are read, materials,
+smoothing groups and relative (negative) indices are not supported.
+'''
+
+import numpy as np
+
+
+# rows formatted at a time
+ROWS_CHUNK = 65536
+# bytes read at a time, rounded up to whole lines
+READ_CHUNK = 16 * 1024 * 1024
+
+# face corner formats by (has uv, has normal)
+DICT_CORNER = {(False, False): " %d",
+               (True, False): " %d/%d",
+               (False, True): " %d//%d",
+               (True, True): " %d/%d/%d"}
+
+
+class ObjMesh(object):
+
+    """
+    One mesh as flat arrays. face_uvs / face_normals: uv / normal index
+    of every face-vertex, None along with uvs / normals when missing
+    """
+
+    __slots__ = ("name", "points", "face_counts", "face_vertices", "uvs",
+                 "face_uvs", "normals", "face_normals")
+
+    def __init__(self, name, points, face_counts, face_vertices, uvs=None,
+                 face_uvs=None, normals=None, face_normals=None):
+        self.name = name
+        self.points = points
+        self.face_counts = face_counts
+        self.face_vertices = face_vertices
+        self.uvs = uvs
+        self.face_uvs = face_uvs
+        self.normals = normals
+        self.face_normals = face_normals
+
+
+def _write_rows(f, tag, rows, fmt):
+    rows = np.asarray(rows)
+    line = tag + (" " + fmt) * rows.shape[1] + "\n"
+    for start in range(0, len(rows), ROWS_CHUNK):
+        chunk = rows[start:start + ROWS_CHUNK]
+        text = (line * len(chunk)) % tuple(chunk.ravel().tolist())
+        f.write(text.encode("ascii"))
+
+
+def _write_faces(f, face_counts, corners, corner_fmt):
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    dict_fmt = dict((i, "f" + corner_fmt * i + "\n")
+                    for i in np.unique(face_counts).tolist())
+    offsets = np.concatenate(([0], np.cumsum(face_counts)))
+    for start in range(0, len(face_counts), ROWS_CHUNK):
+        counts = face_counts[start:start + ROWS_CHUNK].tolist()
+        chunk = corners[offsets[start]:offsets[start + len(counts)]]
+        fmt = "".join([dict_fmt[i] for i in counts])
+        f.write((fmt % tuple(chunk.ravel().tolist())).encode("ascii"))
+
+
+def write_obj(path_file, list_mesh):
+    """
+    Write the ObjMesh objects of list_mesh into one OBJ file
+    """
+    offset_v = offset_vt = offset_vn = 1
+    with open(path_file, "wb") as f:
+        f.write(b"# tx File Buffer\n")
+        for mesh in list_mesh:
+            f.write("o {0}\n".format(mesh.name).encode("utf-8"))
+            _write_rows(f, "v", mesh.points, "%.9g")
+            list_column = [np.asarray(mesh.face_vertices) + offset_v]
+            offset_v += len(mesh.points)
+            has_uv = mesh.uvs is not None
+            if has_uv:
+                _write_rows(f, "vt", mesh.uvs, "%.9g")
+                list_column.append(np.asarray(mesh.face_uvs) + offset_vt)
+                offset_vt += len(mesh.uvs)
+            has_normal = mesh.normals is not None
+            if has_normal:
+                _write_rows(f, "vn", mesh.normals, "%.6g")
+                list_column.append(np.asarray(mesh.face_normals) + offset_vn)
+                offset_vn += len(mesh.normals)
+            _write_faces(f,
+                         mesh.face_counts,
+                         np.column_stack(list_column),
+                         DICT_CORNER[(has_uv, has_normal)])
+
+
+# line types
+_OTHER, _V, _VT, _VN, _F, _GROUP = range(6)
+_DICT_TAG = {_V: b"v ", _VT: b"vt ", _VN: b"vn "}
+# numbers kept per line of every vertex data type
+_DICT_KEEP = {_V: 3, _VT: 2, _VN: 3}
+
+
+def _line_types(buf, starts):
+    """
+    Return the type of every line of buf (uint8 array), starting at starts
+    """
+    first = buf[starts]
+    second = buf[np.minimum(starts + 1, len(buf) - 1)]
+    types = np.full(len(starts), _OTHER, dtype=np.int8)
+    is_v = first == ord("v")
+    types[is_v & (second == ord(" "))] = _V
+    types[is_v & (second == ord("t"))] = _VT
+    types[is_v & (second == ord("n"))] = _VN
+    is_tagged = second == ord(" ")
+    types[is_tagged & (first == ord("f"))] = _F
+    types[is_tagged & ((first == ord("o")) | (first == ord("g")))] = _GROUP
+    return types
+
+
+def _parse_rows(list_text, tag, keep):
+    """
+    Return the numbers of v / vt / vn line runs as (n, keep) rows, extra
+    numbers (w, vertex colors) dropped
+    """
+    if not list_text:
+        return None
+    width = len(list_text[0].split(b"\n", 1)[0].split()) - 1
+    text = b"".join(list_text).replace(tag, b" ")
+    values = np.fromstring(text, dtype=np.float64, sep=" ")
+    return values.reshape(-1, width)[:, :min(width, keep)]
+
+
+def _compact(ids, rows):
+    """
+    Return (the rows ids use, ids into them), so a mesh of a shared file
+    only keeps its own points, uvs or normals
+    """
+    lowest = ids.min()
+    used = np.zeros(ids.max() - lowest + 1, dtype=bool)
+    used[ids - lowest] = True
+    rows = rows[lowest:lowest + len(used)]
+    if used.all():
+        return rows, ids - lowest
+    remap = np.cumsum(used) - 1
+    return rows[used], remap[ids - lowest]
+
+
+def _parse_faces(name, list_text, points, uvs, normals):
+    text = b"".join(list_text)
+    # corners per face: whitespace separated words of a line, but "f"
+    buf = np.frombuffer(text, dtype=np.uint8)
+    is_space = ((buf == ord(" ")) | (buf == ord("\t"))
+                | (buf == ord("\n")) | (buf == ord("\r")))
+    is_word = ~is_space
+    is_word[1:] &= is_space[:-1]
+    num_words = np.searchsorted(np.flatnonzero(is_word),
+                                np.flatnonzero(buf == ord("\n")))
+    face_counts = np.diff(np.concatenate(([0], num_words))) - 1
+    # every corner of a mesh is written alike, the first tells how
+    parts = text.split(None, 2)[1].split(b"/")
+    has_uv = len(parts) > 1 and parts[1] != b""
+    has_normal = len(parts) > 2 and parts[2] != b""
+    width = 1 + has_uv + has_normal
+    values = np.fromstring(text.replace(b"f ", b" ").replace(b"/", b" "),
+                           dtype=np.int64, sep=" ")
+    if len(values) != face_counts.sum() * width:
+        raise ValueError("Mixed face formats in {0}".format(name))
+    if len(values) and values.min() < 1:
+        raise ValueError("Relative face indices in {0}".format(name))
+    values = values.reshape(-1, width) - 1
+    mesh_points, face_vertices = _compact(values[:, 0], points)
+    mesh = ObjMesh(name, mesh_points, face_counts, face_vertices)
+    if has_uv:
+        mesh.uvs, mesh.face_uvs = _compact(values[:, 1], uvs)
+    if has_normal:
+        mesh.normals, mesh.face_normals = _compact(values[:, -1], normals)
+    return mesh
+
+
+def read_obj(path_file):
+    """
+    Return the ObjMesh objects of an OBJ file, one per o / g group
+    holding faces
+    """
+    dict_text = {_V: [], _VT: [], _VN: []}
+    list_group = []  # [(name, runs of f lines), ...]
+    name = "mesh"
+    list_f = []
+    with open(path_file, "rb") as f:
+        while True:
+            # whole lines only
+            data = f.read(READ_CHUNK) + f.readline()
+            if not data:
+                break
+            if not data.endswith(b"\n"):
+                data += b"\n"
+            buf = np.frombuffer(data, dtype=np.uint8)
+            ends = np.flatnonzero(buf == ord("\n")) + 1
+            starts = np.concatenate(([0], ends[:-1]))
+            types = _line_types(buf, starts)
+            # lines of a type come in long runs, handle a run at a time
+            run_starts = np.concatenate(
+                ([0], np.flatnonzero(np.diff(types)) + 1))
+            run_ends = np.append(run_starts[1:], len(types))
+            for first, last in zip(run_starts.tolist(), run_ends.tolist()):
+                line_type = types[first]
+                if line_type == _OTHER:
+                    continue
+                text = data[starts[first]:ends[last - 1]]
+                if line_type == _F:
+                    list_f.append(text)
+                elif line_type == _GROUP:
+                    if list_f:
+                        list_group.append((name, list_f))
+                        list_f = []
+                    # the last of consecutive group lines names the mesh
+                    name = text.splitlines()[-1][2:].strip()
+                    name = name.decode("utf-8") or "mesh"
+                else:
+                    dict_text[line_type].append(text)
+    if list_f:
+        list_group.append((name, list_f))
+
+    points, uvs, normals = [_parse_rows(dict_text[i], _DICT_TAG[i],
+                                        _DICT_KEEP[i])
+                            for i in (_V, _VT, _VN)]
+    return [_parse_faces(name, list_text, points, uvs, normals)
+            for name, list_text in list_group]
+
+
+if __name__ == '__main__':
+    import os
+    import shutil
+    import tempfile
+    import time
+
+    def grid_mesh(name, size, offset):
+        # size x size quads with uvs and one normal per vertex
+        x, z = np.meshgrid(np.arange(size + 1), np.arange(size + 1))
+        points = np.column_stack((x.ravel(), np.zeros(x.size), z.ravel()))
+        points = points * 0.01 + offset
+        corner = (np.arange(size)[:, None] * (size + 1)
+                  + np.arange(size)[None, :]).ravel()
+        face_vertices = np.column_stack((corner,
+                                         corner + 1,
+                                         corner + size + 2,
+                                         corner + size + 1)).ravel()
+        return ObjMesh(name,
+                       points,
+                       np.full(size * size, 4, dtype=np.int64),
+                       face_vertices,
+                       points[:, [0, 2]] / (size * 0.01),
+                       face_vertices,
+                       np.tile([0.0, 1.0, 0.0], (len(points), 1)),
+                       face_vertices)
+
+    dir_temp = tempfile.mkdtemp(prefix="txObjCodec_")
+    try:
+        for size, num_mesh in ((300, 4), (1000, 1), (700, 4)):
+            list_mesh = [grid_mesh("grid{0}".format(i), size, i * 20.0)
+                         for i in range(num_mesh)]
+            path_file = os.path.join(dir_temp, "bench.obj")
+            time_start = time.time()
+            write_obj(path_file, list_mesh)
+            time_write = time.time() - time_start
+            time_start = time.time()
+            list_read = read_obj(path_file)
+            time_read = time.time() - time_start
+            for mesh, read in zip(list_mesh, list_read):
+                assert np.allclose(mesh.points, read.points)
+                assert np.array_equal(mesh.face_vertices, read.face_vertices)
+                assert np.array_equal(mesh.face_uvs, read.face_uvs)
+                assert np.allclose(mesh.normals, read.normals)
+            size_mb = os.path.getsize(path_file) / 2.0 ** 20
+            print("{0} faces, {1:.0f}MB: write {2:.2f}s ({3:.0f}MB/s), "
+                  "read {4:.2f}s ({5:.0f}MB/s)".format(
+                      size * size * num_mesh, size_mb,
+                      time_write, size_mb / time_write,
+                      time_read, size_mb / time_read))
+    finally:
+        shutil.rmtree(dir_temp, ignore_errors=True)
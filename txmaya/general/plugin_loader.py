@@ -0,0 +1,62 @@
+'''
+Summary:
+load maya plug-ins on first use instead of at import time.
+
+Plug-ins are named without their extension (AbcExport, not AbcExport.so):
+loadPlugin and pluginInfo resolve a bare name to .so, .mll or .bundle on
+every platform. Loaded plug-ins are remembered, asking again is a set
+lookup.
+'''
+
+import maya.cmds as mc
+
+
+# plug-ins a file format needs, by (format, "export" / "import")
+DICT_FORMAT_PLUGINS = {("abc", "export"): ["AbcExport"],
+                       ("abc", "import"): ["AbcImport"],
+                       ("fbx", "export"): ["fbxmaya"],
+                       ("fbx", "import"): ["fbxmaya"],
+                       ("obj", "export"): ["objExport"],
+                       ("obj", "import"): ["objExport"]}
+
+# plug-ins known to be loaded
+_loaded = set()
+
+
+def is_loaded(name):
+    if name in _loaded:
+        return True
+    if mc.pluginInfo(name, query=True, loaded=True):
+        _loaded.add(name)
+        return True
+    return False
+
+
+def load(name):
+    """
+    Load plug-in name unless it already is. Raise RuntimeError when maya
+    can't load it
+    """
+    if is_loaded(name):
+        return
+    try:
+        mc.loadPlugin(name, quiet=True)
+    except RuntimeError:
+        raise RuntimeError("Plug-in {0} can't be loaded.".format(name))
+    _loaded.add(name)
+
+
+def load_for_format(ext, mode):
+    """
+    Load the plug-ins needed to export (mode "export") or import
+    (mode "import") files of format ext. Maya's own formats need none
+    """
+    for name in DICT_FORMAT_PLUGINS.get((ext, mode), []):
+        load(name)
+
+
+def forget():
+    """
+    Drop what is remembered, after plug-ins were unloaded by hand
+    """
+    _loaded.clear()
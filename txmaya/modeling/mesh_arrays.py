@@ -0,0 +1,388 @@
+'''
+Summary:
+bulk access to maya meshes as flat numpy arrays.
+
+Each getter does one API call per mesh instead of one command per component,
+the heavy math then happens on the arrays (see texel_density_engine).
+'''
+
+import numpy as np
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from txmaya.general import api_undo
+
+
+def get_dag_path(node):
+    """
+    Return the MDagPath of a node name
+    """
+    sel = om2.MSelectionList()
+    sel.add(node)
+    return sel.getDagPath(0)
+
+
+def get_mesh_fn(node):
+    """
+    Return an MFnMesh for a mesh shape or its transform
+    """
+    dag_path = get_dag_path(node)
+    if dag_path.apiType() != om2.MFn.kMesh:
+        dag_path.extendToShape()
+    return om2.MFnMesh(dag_path)
+
+
+def get_points(mesh_fn, space=om2.MSpace.kWorld):
+    """
+    Return the mesh's points as an (n, 3) float64 array
+    """
+    points = mesh_fn.getPoints(space)
+    return np.array(points, dtype=np.float64).reshape(-1, 4)[:, :3]
+
+
+def get_face_vertices(mesh_fn):
+    """
+    Return (vertex count per face, flat face-vertex indices)
+    """
+    counts, indices = mesh_fn.getVertices()
+    return (np.array(counts, dtype=np.int64),
+            np.array(indices, dtype=np.int64))
+
+
+def get_normals(mesh_fn, space=om2.MSpace.kWorld):
+    """
+    Return (normals as an (n, 3) float64 array, normal id of every
+    face-vertex)
+    """
+    normals = mesh_fn.getNormals(space)
+    counts, ids = mesh_fn.getNormalIds()
+    return (np.array(normals, dtype=np.float64).reshape(-1, 3),
+            np.array(ids, dtype=np.int64))
+
+
+def get_uvs(mesh_fn, uv_set=None):
+    """
+    Return (u, v) arrays of a uv set, the current one by default
+    """
+    uv_set = uv_set or mesh_fn.currentUVSetName()
+    u, v = mesh_fn.getUVs(uv_set)
+    return (np.array(u, dtype=np.float64),
+            np.array(v, dtype=np.float64))
+
+
+def get_assigned_uvs(mesh_fn, uv_set=None):
+    """
+    Return (uv count per face, flat face-uv ids) of a uv set
+    """
+    uv_set = uv_set or mesh_fn.currentUVSetName()
+    counts, ids = mesh_fn.getAssignedUVs(uv_set)
+    return (np.array(counts, dtype=np.int64),
+            np.array(ids, dtype=np.int64))
+
+
+def set_points_and_uvs(mesh_fn, points=None, dict_uvs=None,
+                       space=om2.MSpace.kObject):
+    """
+    Write points ((n, 3) array) and/or uvs ({uv set: (u, v)}) back
+    to a mesh in one undoable call
+    """
+    dag_path = mesh_fn.dagPath()
+    dict_uvs = dict_uvs or {}
+    points_old = mesh_fn.getPoints(space) if points is not None else None
+    points_new = None
+    if points is not None:
+        points_new = om2.MPointArray([om2.MPoint(*i) for i in
+                                      np.asarray(points).tolist()])
+    dict_uvs_old = dict((i, mesh_fn.getUVs(i)) for i in dict_uvs)
+    dict_uvs_new = dict((i, (np.asarray(u, dtype=np.float64).tolist(),
+                             np.asarray(v, dtype=np.float64).tolist()))
+                        for i, (u, v) in dict_uvs.items())
+
+    def apply_arrays(points_values, dict_uv_values):
+        fn = om2.MFnMesh(dag_path)
+        if points_values is not None:
+            fn.setPoints(points_values, space)
+        for uv_set, (u_values, v_values) in dict_uv_values.items():
+            fn.setUVs(u_values, v_values, uv_set)
+
+    api_undo.commit(undo=lambda: apply_arrays(points_old, dict_uvs_old),
+                    redo=lambda: apply_arrays(points_new, dict_uvs_new))
+
+
+def get_mesh_state(mesh_fn, uv_set=None):
+    """
+    Return a cheap snapshot of what a mesh's world space face areas
+    depend on: topology counts, uv set and world matrix.
+    Point and uv edits that keep the counts are not in here, watch
+    them with a dirty callback.
+    """
+    uv_set = uv_set or mesh_fn.currentUVSetName()
+    return (mesh_fn.numVertices,
+            mesh_fn.numPolygons,
+            mesh_fn.numFaceVertices,
+            mesh_fn.numUVs(uv_set),
+            uv_set,
+            tuple(mesh_fn.dagPath().inclusiveMatrix()))
+
+
+def get_selected_mesh_components(component_type="face"):
+    """
+    Return [(mesh shape full path, indices array or None), ...] for the
+    current selection converted to "face" or "uv" components.
+    None means every component. The selection itself is not touched.
+    """
+    list_sel = mc.ls(sl=True, long=True) or []
+    if not list_sel:
+        return []
+    if component_type == "uv":
+        list_components = mc.polyListComponentConversion(list_sel,
+                                                          toUV=True) or []
+    else:
+        list_components = mc.polyListComponentConversion(list_sel,
+                                                          toFace=True) or []
+    sel = om2.MSelectionList()
+    for i in list_components:
+        sel.add(i)
+    dict_components = {}
+    list_order = []
+    for index in range(sel.length()):
+        dag_path, component = sel.getComponent(index)
+        if dag_path.apiType() != om2.MFn.kMesh:
+            dag_path.extendToShape()
+        shape = dag_path.fullPathName()
+        if shape not in dict_components:
+            dict_components[shape] = []
+            list_order.append(shape)
+        if component.isNull():
+            dict_components[shape].append(None)
+        else:
+            elements = om2.MFnSingleIndexedComponent(component).getElements()
+            dict_components[shape].append(np.array(elements, dtype=np.int64))
+    list_mesh_components = []
+    for shape in list_order:
+        chunks = dict_components[shape]
+        if any(i is None for i in chunks):
+            list_mesh_components.append((shape, None))
+        else:
+            list_mesh_components.append((shape,
+                                         np.unique(np.concatenate(chunks))))
+    return list_mesh_components
+
+
+def get_selected_mesh_faces():
+    """
+    Return [(mesh shape full path, face indices array or None), ...]
+    """
+    return get_selected_mesh_components("face")
+
+
+def get_selected_mesh_uvs():
+    """
+    Return [(mesh shape full path, uv ids array or None), ...]
+    """
+    return get_selected_mesh_components("uv")
+
+
+def set_uvs(mesh_fn, u, v, uv_set=None):
+    """
+    Write whole (u, v) arrays back to a uv set in one undoable call
+    """
+    uv_set = uv_set or mesh_fn.currentUVSetName()
+    dag_path = mesh_fn.dagPath()
+    u_old, v_old = mesh_fn.getUVs(uv_set)
+    u_new = np.asarray(u, dtype=np.float64).tolist()
+    v_new = np.asarray(v, dtype=np.float64).tolist()
+
+    def apply_uvs(u_values, v_values):
+        om2.MFnMesh(dag_path).setUVs(u_values, v_values, uv_set)
+
+    api_undo.commit(undo=lambda: apply_uvs(u_old, v_old),
+                    redo=lambda: apply_uvs(u_new, v_new))
+
+
+def get_uv_sets_data(mesh_fn):
+    """
+    Return [(uv set, u, v, uv count per face, face-uv ids), ...]
+    of every uv set, as API arrays ready to be written back
+    """
+    list_data = []
+    for uv_set in mesh_fn.getUVSetNames():
+        u, v = mesh_fn.getUVs(uv_set)
+        counts, ids = mesh_fn.getAssignedUVs(uv_set)
+        list_data.append((uv_set, u, v, counts, ids))
+    return list_data
+
+
+def _apply_uv_sets_data(dag_path, list_data, current_uv_set,
+                        list_delete=()):
+    mesh_fn = om2.MFnMesh(dag_path)
+    list_existing = mesh_fn.getUVSetNames()
+    for uv_set, u, v, counts, ids in list_data:
+        if uv_set not in list_existing:
+            mesh_fn.createUVSet(uv_set)
+        mesh_fn.clearUVs(uv_set)
+        mesh_fn.setUVs(u, v, uv_set)
+        mesh_fn.assignUVs(counts, ids, uv_set)
+    mesh_fn.setCurrentUVSetName(current_uv_set)
+    for uv_set in list_delete:
+        mesh_fn.deleteUVSet(uv_set)
+
+
+def set_uv_sets_data(mesh_fn, list_data, current_uv_set=None):
+    """
+    Write every uv set of list_data (see get_uv_sets_data) onto a mesh
+    of the same topology in one undoable call, without history.
+    Missing uv sets are created, the mesh's other uv sets are kept.
+    """
+    dag_path = mesh_fn.dagPath()
+    current_old = mesh_fn.currentUVSetName()
+    current_uv_set = current_uv_set or list_data[0][0]
+    list_data_old = get_uv_sets_data(mesh_fn)
+    list_existing = [i[0] for i in list_data_old]
+    list_created = [i[0] for i in list_data if i[0] not in list_existing]
+
+    api_undo.commit(undo=lambda: _apply_uv_sets_data(dag_path,
+                                                     list_data_old,
+                                                     current_old,
+                                                     list_created),
+                    redo=lambda: _apply_uv_sets_data(dag_path,
+                                                     list_data,
+                                                     current_uv_set))
+
+
+def get_edges(mesh_fn):
+    """
+    Return (vertex pair of every edge as an (n, 2) array, whether each
+    edge is smooth), read in one getAttr of the mesh's edge array
+    """
+    if mesh_fn.numEdges == 0:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=bool)
+    # every item is (vertex 1, vertex 2, smooth)
+    edges = np.array(mc.getAttr(mesh_fn.fullPathName() + ".ed[*]"),
+                     dtype=np.int64).reshape(-1, 3)
+    return edges[:, :2], edges[:, 2] != 0
+
+
+def get_hard_edges(mesh_fn):
+    """
+    Return the vertex pairs of the mesh's hard edges as an (n, 2) array
+    """
+    edge_vertices, smooth = get_edges(mesh_fn)
+    return edge_vertices[~smooth]
+
+
+def _edge_keys(pairs, num_vertices):
+    # one int per undirected vertex pair
+    pairs = np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1, 2), axis=1)
+    return pairs[:, 0] * num_vertices + pairs[:, 1]
+
+
+def _set_hard_edges(mesh_fn, hard_edges):
+    edge_vertices = get_edges(mesh_fn)[0]
+    num_vertices = mesh_fn.numVertices
+    is_hard = np.isin(_edge_keys(edge_vertices, num_vertices),
+                      _edge_keys(hard_edges, num_vertices))
+    mesh_fn.setEdgeSmoothings(np.arange(len(is_hard)).tolist(),
+                              (~is_hard).tolist())
+    mesh_fn.cleanupEdgeSmoothing()
+    mesh_fn.updateSurface()
+
+
+def _apply_mesh_data(dag_path, points, counts, indices, list_uv_data,
+                     current_uv_set, hard_edges):
+    mesh_fn = om2.MFnMesh(dag_path)
+    mesh_fn.createInPlace(points, counts, indices)
+    _apply_uv_sets_data(dag_path, list_uv_data, current_uv_set)
+    if hard_edges is not None:
+        _set_hard_edges(om2.MFnMesh(dag_path), hard_edges)
+
+
+def set_mesh_data(mesh_fn, points, face_counts, face_vertices, list_data,
+                  current_uv_set=None, hard_edges=None):
+    """
+    Replace a mesh's whole geometry: object space points ((n, 3) array),
+    faces, every uv set of list_data (see get_uv_sets_data) and the hard
+    edges given as vertex pairs (see get_hard_edges, all edges are soft
+    without), in one undoable call. Locked normals and color sets are
+    not rebuilt, undo brings the whole old mesh back.
+    Meant for meshes without history, an upstream node would overwrite
+    the result.
+    """
+    dag_path = mesh_fn.dagPath()
+    current_uv_set = current_uv_set or mesh_fn.currentUVSetName()
+    # a copy of the old mesh data keeps what the arrays don't hold
+    data_old = om2.MFnMeshData().create()
+    om2.MFnMesh().copy(mesh_fn.object(), data_old)
+    points_new = om2.MPointArray([om2.MPoint(*i) for i in
+                                  np.asarray(points).tolist()])
+    counts_new = np.asarray(face_counts, dtype=np.int64).tolist()
+    indices_new = np.asarray(face_vertices, dtype=np.int64).tolist()
+
+    api_undo.commit(undo=lambda: om2.MFnMesh(dag_path).copyInPlace(data_old),
+                    redo=lambda: _apply_mesh_data(dag_path,
+                                                  points_new,
+                                                  counts_new,
+                                                  indices_new,
+                                                  list_data,
+                                                  current_uv_set,
+                                                  hard_edges))
+
+
+def _create_mesh(name, points, counts, indices, uv_data, normal_data):
+    mesh_fn = om2.MFnMesh()
+    node_transform = mesh_fn.create(points, counts, indices)
+    if uv_data is not None:
+        u, v, ids = uv_data
+        mesh_fn.setUVs(u, v)
+        mesh_fn.assignUVs(counts, ids)
+    if normal_data is not None:
+        mesh_fn.setFaceVertexNormals(*normal_data)
+    om2.MFnDagNode(node_transform).setName(name)
+    dag_path = om2.MDagPath.getAPathTo(node_transform).extendToShape()
+    sel = om2.MSelectionList()
+    sel.add("initialShadingGroup")
+    om2.MFnSet(sel.getDependNode(0)).addMember(dag_path)
+    return node_transform
+
+
+def create_mesh(name, points, face_counts, face_vertices, uvs=None,
+                face_uvs=None, normals=None, face_normals=None):
+    """
+    Create a new mesh in one undoable call: points ((n, 3) array), faces,
+    uvs of the current uv set ((n, 2) array) and normals ((n, 3) array)
+    with their index per face-vertex. The mesh gets the default shader.
+    Return the new transform's full path
+    """
+    points_new = om2.MPointArray([om2.MPoint(*i) for i in
+                                  np.asarray(points).tolist()])
+    counts_new = np.asarray(face_counts, dtype=np.int64).tolist()
+    indices_new = np.asarray(face_vertices, dtype=np.int64).tolist()
+    uv_data = None
+    if uvs is not None:
+        uvs = np.asarray(uvs, dtype=np.float64)
+        uv_data = (uvs[:, 0].tolist(),
+                   uvs[:, 1].tolist(),
+                   np.asarray(face_uvs, dtype=np.int64).tolist())
+    normal_data = None
+    if normals is not None:
+        normals = np.asarray(normals, dtype=np.float64)[face_normals]
+        face_ids = np.repeat(np.arange(len(counts_new)), counts_new)
+        normal_data = (om2.MVectorArray([om2.MVector(*i) for i in
+                                         normals.tolist()]),
+                       face_ids.tolist(),
+                       indices_new)
+    # the node of the last redo, undo deletes it
+    list_node = []
+
+    def redo():
+        list_node[:] = [_create_mesh(name, points_new, counts_new,
+                                     indices_new, uv_data, normal_data)]
+
+    def undo():
+        dag_modifier = om2.MDagModifier()
+        dag_modifier.deleteNode(list_node.pop())
+        dag_modifier.doIt()
+
+    api_undo.commit(undo=undo, redo=redo)
+    return om2.MDagPath.getAPathTo(list_node[0]).fullPathName()
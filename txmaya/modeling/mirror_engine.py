@@ -0,0 +1,96 @@
+'''
+Summary:
+reflection math used by tx Mirrorer.
+
+Matrices follow maya's row-vector convention (point * matrix, translation
+in the last row), as returned by MMatrix / xform(q=True, matrix=True).
+'''
+
+import numpy as np
+
+
+AXIS_NORMALS = {"x": (1.0, 0.0, 0.0),
+                "y": (0.0, 1.0, 0.0),
+                "z": (0.0, 0.0, 1.0)}
+
+
+def reflection_matrix(normal, point=(0.0, 0.0, 0.0)):
+    """
+    Return the 4x4 matrix reflecting about the plane through point
+    with the given normal
+    """
+    normal = np.asarray(normal, dtype=np.float64)
+    normal = normal / np.linalg.norm(normal)
+    point = np.asarray(point, dtype=np.float64)
+    matrix = np.identity(4)
+    matrix[:3, :3] -= 2.0 * np.outer(normal, normal)
+    matrix[3, :3] = 2.0 * np.dot(point, normal) * normal
+    return matrix
+
+
+def mirror_local_matrices(world_matrices, parent_matrices, reflection):
+    """
+    Return the local matrices that put objects at their world matrices
+    reflected, under the same parents. Inputs are (n, 4, 4) arrays
+    """
+    world_matrices = np.asarray(world_matrices, dtype=np.float64)
+    world_mirrored = np.matmul(world_matrices, reflection)
+    return local_matrices(world_mirrored, parent_matrices)
+
+
+def local_matrices(world_matrices, parent_matrices):
+    """
+    Return the local matrices giving the world matrices under the parents
+    """
+    parent_matrices = np.asarray(parent_matrices, dtype=np.float64)
+    return np.matmul(np.asarray(world_matrices, dtype=np.float64),
+                     np.linalg.inv(parent_matrices))
+
+
+def instance_world_matrices(world_matrices, reflection, leader_world=None):
+    """
+    Return world matrices for instances of a mirrored shape, one per
+    original object (world_matrices, (n, 4, 4)).
+    leader_world: None when the shared shape is untouched (mirrored by
+    negative scale), else the world matrix of the object whose shape
+    had its points reflected in place (baked)
+    """
+    world_mirrored = np.matmul(np.asarray(world_matrices, dtype=np.float64),
+                               reflection)
+    if leader_world is None:
+        return world_mirrored
+    # a baked shape already carries the leader's reflection, undo it
+    # (a reflection is its own inverse) before placing the instance
+    return np.matmul(local_reflection_matrix(leader_world, reflection),
+                     world_mirrored)
+
+
+def transform_points(points, matrix):
+    """
+    Return (n, 3) points multiplied by a 4x4 row-vector matrix
+    """
+    points = np.asarray(points, dtype=np.float64)[:, :3]
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return np.dot(points, matrix[:3, :3]) + matrix[3, :3]
+
+
+def local_reflection_matrix(world_matrix, reflection):
+    """
+    Return the matrix reflecting object space points of an object with
+    the given world matrix about a world space plane, so the object's
+    transform can stay as it is
+    """
+    world_matrix = np.asarray(world_matrix, dtype=np.float64)
+    return np.dot(np.dot(world_matrix, reflection),
+                  np.linalg.inv(world_matrix))
+
+
+def flip_u(u):
+    """
+    Return u flipped about the center of its own range, like polyFlipUV
+    on a whole uv set
+    """
+    u = np.asarray(u, dtype=np.float64)
+    if len(u) == 0:
+        return u.copy()
+    return u.min() + u.max() - u
@@ -1,14 +1,22 @@
-import random
-
 import maya.cmds as mc
 import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
+import maya.api.OpenMaya as om2
 
 from PySide2 import QtCore
 from PySide2 import QtWidgets
 from PySide2 import QtGui
 from shiboken2 import wrapInstance
 
+from txmaya.general import api_undo
+from txmaya.general import lazy_module
+
+# numpy and the engines load on first use
+np = lazy_module.LazyModule("numpy")
+mesh_arrays = lazy_module.LazyModule("txmaya.modeling.mesh_arrays")
+mirror_engine = lazy_module.LazyModule("txmaya.modeling.mirror_engine")
+weld_engine = lazy_module.LazyModule("txmaya.modeling.weld_engine")
+
 __author__ = "Xiaowei Oscar Tan"
 __version__ = '3.2.0'
 
@@ -42,7 +50,7 @@ class Mirrorer(QtWidgets.QDialog):
         self.setWindowTitle('tx Mirrorer')
         # init win size
         self.setMinimumWidth(250)
-        self.setMaximumHeight(108)
+        self.setMaximumHeight(250)
         # win OS only. get rid of '?' button on GUI.
         self.setWindowFlags(self.windowFlags()
                             ^ QtCore.Qt.WindowContextHelpButtonHint)
@@ -58,6 +66,28 @@ class Mirrorer(QtWidgets.QDialog):
         self.label_space = QtWidgets.QLabel("Space: ")
         self.text_world = QtWidgets.QLabel("<b>World</b>")
 
+        self.checkbox_bake = QtWidgets.QCheckBox("Bake into Geometry")
+        self.checkbox_bake.setToolTip("Mirror the points and keep positive "
+                                      "transforms instead of a -1 scale")
+
+        self.label_plane = QtWidgets.QLabel("Plane: ")
+        self.combo_plane = QtWidgets.QComboBox()
+        self.combo_plane.addItems(["World Origin",
+                                   "Selection Pivot",
+                                   "Selection Bounds"])
+        self.combo_plane.setToolTip("Selection Bounds fits the plane onto "
+                                    "the open side of half meshes")
+
+        self.checkbox_weld = QtWidgets.QCheckBox("Weld Seam")
+        self.checkbox_weld.setToolTip("Weld the mirror into the original "
+                                      "mesh. Locked normals are not kept")
+        self.spin_tolerance = QtWidgets.QDoubleSpinBox()
+        self.spin_tolerance.setDecimals(4)
+        self.spin_tolerance.setRange(0.0001, 10.0)
+        self.spin_tolerance.setSingleStep(0.001)
+        self.spin_tolerance.setValue(0.001)
+        self.spin_tolerance.setToolTip("Weld and plane fitting distance")
+
         self.button_x = QtWidgets.QPushButton("Along X")
         self.button_x.setStyleSheet("background-color:rgb(160,0,0)")
         self.button_y = QtWidgets.QPushButton("Along Y")
@@ -65,75 +95,385 @@ class Mirrorer(QtWidgets.QDialog):
         self.button_z = QtWidgets.QPushButton("Along Z")
         self.button_z.setStyleSheet("background-color:rgb(0,0,160)")
 
+        self.label_custom = QtWidgets.QLabel("Custom: ")
+        self.line_edit_normal = QtWidgets.QLineEdit("1 0 0")
+        self.line_edit_normal.setToolTip("Mirror plane normal: x y z")
+        self.line_edit_point = QtWidgets.QLineEdit()
+        self.line_edit_point.setPlaceholderText("point x y z")
+        self.line_edit_point.setToolTip("A point on the mirror plane. "
+                                        "Empty, the Plane option places it")
+        self.button_custom = QtWidgets.QPushButton("Along Custom Normal")
+
     def create_layouts(self):
         layout_space = QtWidgets.QHBoxLayout()
         layout_space.addWidget(self.label_space)
         layout_space.addWidget(self.text_world)
         layout_space.addStretch()
+        layout_space.addWidget(self.checkbox_bake)
+
+        layout_plane = QtWidgets.QHBoxLayout()
+        layout_plane.addWidget(self.label_plane)
+        layout_plane.addWidget(self.combo_plane)
+        layout_plane.addStretch()
+        layout_plane.addWidget(self.checkbox_weld)
+        layout_plane.addWidget(self.spin_tolerance)
+
+        layout_custom = QtWidgets.QHBoxLayout()
+        layout_custom.addWidget(self.label_custom)
+        layout_custom.addWidget(self.line_edit_normal)
+        layout_custom.addWidget(self.line_edit_point)
 
         layout_buttons = QtWidgets.QVBoxLayout()
         layout_buttons.addWidget(self.button_x)
         layout_buttons.addWidget(self.button_y)
         layout_buttons.addWidget(self.button_z)
+        layout_buttons.addWidget(self.button_custom)
 
         layout_root = QtWidgets.QVBoxLayout(self)
         layout_root.addLayout(layout_space)
+        layout_root.addLayout(layout_plane)
+        layout_root.addLayout(layout_custom)
         layout_root.addLayout(layout_buttons)
 
     def create_connections(self):
         self.button_x.clicked.connect(lambda: self.mirrorer(self.button_x))
         self.button_y.clicked.connect(lambda: self.mirrorer(self.button_y))
         self.button_z.clicked.connect(lambda: self.mirrorer(self.button_z))
+        self.button_custom.clicked.connect(
+            lambda: self.mirrorer(self.button_custom))
 
     # method
     def mirrorer(self, button):
         if button.text() == "Along X":
-            mirror_channel = '.scaleX'
+            normal = mirror_engine.AXIS_NORMALS["x"]
         if button.text() == "Along Y":
-            mirror_channel = '.scaleY'
+            normal = mirror_engine.AXIS_NORMALS["y"]
         if button.text() == "Along Z":
-            mirror_channel = '.scaleZ'
-
-        current_sel = mc.ls(sl=True)
-        for i in current_sel:
-            # get info
-            name = i.split("|")[-1]
-            hierarchy = mc.listRelatives(i, fullPath=True) or [""]
-            hierarchy_list = hierarchy[0].split("|")
-            hierarchy_root = "|".join(hierarchy_list[:-2]) or "|"
-            # do duplicate
-            i_mirror = mc.duplicate(i, name=name + "_MIRROR")
-            i_grp_temp = mc.group(empty=True, n="txMirrorer_temp")
-            mc.parent(i_mirror[0], "txMirrorer_temp")
-            # do mirroring
-            mc.xform(i_grp_temp,
-                     worldSpace=True,
-                     scalePivot=[0, 0, 0],
-                     rotatePivot=[0, 0, 0])
-            mc.setAttr(i_grp_temp + mirror_channel, -1)
-            # put the mirrored back to original hierarchy
-            if hierarchy_root == "|":
-                mc.parent(i_mirror[0], world=True)
-            else:
-                mc.parent(i_mirror[0], hierarchy_root)
-            mc.delete(i_grp_temp)
-            # clean up scale attr, uv and normals
-            # mc.makeIdentity(i_mirror[0],
-            #                 apply=True,
-            #                 preserveNormals=True,
-            #                 translate=False,
-            #                 rotate=False,
-            #                 scale=True,
-            #                 normal=False)
-            # do UV flip
-            list_mirrored_mesh = mc.listRelatives(i_mirror[0],
+            normal = mirror_engine.AXIS_NORMALS["z"]
+        plane_point = None
+        if button is self.button_custom:
+            normal = self.read_vector(self.line_edit_normal)
+            if normal is None or not np.any(normal):
+                om.MGlobal.displayWarning("Invalid custom normal!")
+                return
+            if self.line_edit_point.text().strip():
+                plane_point = self.read_vector(self.line_edit_point)
+                if plane_point is None:
+                    om.MGlobal.displayWarning("Invalid custom point!")
+                    return
+
+        current_sel = mc.ls(sl=True, long=True, type="transform") or []
+        if not current_sel:
+            om.MGlobal.displayWarning("Select at least 1 geo!")
+            return
+        tolerance = self.spin_tolerance.value()
+        if plane_point is None:
+            plane_point = self.get_plane_point(current_sel, normal,
+                                               tolerance)
+        reflection = mirror_engine.reflection_matrix(normal, plane_point)
+
+        if self.checkbox_weld.isChecked():
+            with api_undo.undo_chunk("txMirrorer"):
+                self.merge_geometry(self.list_weld_meshes(current_sel),
+                                    reflection,
+                                    tolerance)
+            mc.select(current_sel)
+            return
+
+        # objects sharing shapes get mirrored once, the rest are instances
+        list_group = self.group_instances(current_sel)
+        list_leader = [i[0] for i in list_group]
+        bake = self.checkbox_bake.isChecked()
+
+        with api_undo.undo_chunk("txMirrorer"):
+            # do duplicate, all at once
+            list_duplicate = mc.duplicate(list_leader, returnRootsOnly=True)
+            # dag paths stay valid through renaming
+            list_dag_path = [mesh_arrays.get_dag_path(i)
+                             for i in list_duplicate]
+            for i, dag_path in zip(list_leader, list_dag_path):
+                mc.rename(dag_path.fullPathName(),
+                          i.split("|")[-1] + "_MIRROR")
+            list_mirror = [i.fullPathName() for i in list_dag_path]
+            list_mirrored_mesh = mc.listRelatives(list_mirror,
                                                   allDescendents=True,
                                                   type="mesh",
+                                                  noIntermediate=True,
                                                   fullPath=True) or []
-            if list_mirrored_mesh:
-                for j in list_mirrored_mesh:
-                    mc.polyFlipUV(j)
-            mc.select(i_mirror[0])
+            list_set_dag_path = []
+            list_set_matrix = []
+            if bake:
+                self.mirror_geometry(list_mirrored_mesh, reflection)
+            else:
+                # do mirroring: reflect world matrices, keep the hierarchy
+                world_matrices = [self.to_array(i.inclusiveMatrix())
+                                  for i in list_dag_path]
+                parent_matrices = [self.to_array(i.exclusiveMatrix())
+                                   for i in list_dag_path]
+                local_matrices = mirror_engine.mirror_local_matrices(
+                    world_matrices, parent_matrices, reflection)
+                list_set_dag_path.extend(list_dag_path)
+                list_set_matrix.extend(local_matrices)
+                # do UV flip, every uv set like in bake mode
+                for mesh in list_mirrored_mesh:
+                    mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+                    mesh_arrays.set_points_and_uvs(
+                        mesh_fn, dict_uvs=self.flip_uv_sets(mesh_fn))
+            # instance the mirrored shapes for the rest of each group
+            list_instance_mirror = []
+            for (_, list_other), mirror, dag_path in zip(list_group,
+                                                         list_mirror,
+                                                         list_dag_path):
+                if not list_other:
+                    continue
+                leader_world = None
+                if bake:
+                    leader_world = self.to_array(dag_path.inclusiveMatrix())
+                list_instance = self.instance_mirror(mirror, list_other)
+                list_instance_mirror.extend(i.fullPathName()
+                                            for i in list_instance)
+                list_other_dag_path = [mesh_arrays.get_dag_path(i)
+                                       for i in list_other]
+                world_matrices = mirror_engine.instance_world_matrices(
+                    [self.to_array(i.inclusiveMatrix())
+                     for i in list_other_dag_path],
+                    reflection,
+                    leader_world)
+                parent_matrices = [self.to_array(i.exclusiveMatrix())
+                                   for i in list_other_dag_path]
+                local_matrices = mirror_engine.local_matrices(
+                    world_matrices, parent_matrices)
+                list_set_dag_path.extend(list_instance)
+                list_set_matrix.extend(local_matrices)
+            if list_set_dag_path:
+                self.set_local_matrices(list_set_dag_path, list_set_matrix)
+            mc.select(list_mirror + list_instance_mirror)
+
+    def read_vector(self, line_edit):
+
+        """
+        return the 3 numbers of a line edit ("x y z" or "x, y, z") as an
+        array, None when it holds anything else
+        """
+
+        list_value = line_edit.text().replace(",", " ").split()
+        if len(list_value) != 3:
+            return None
+        try:
+            return np.array([float(i) for i in list_value])
+        except ValueError:
+            return None
+
+    def get_plane_point(self, list_transform, normal, tolerance):
+
+        """ return a point on the mirror plane picked in the ui """
+
+        plane = self.combo_plane.currentText()
+        if plane == "Selection Pivot":
+            list_pivot = [mc.xform(i, q=True, worldSpace=True,
+                                   rotatePivot=True)
+                          for i in list_transform]
+            return np.mean(list_pivot, axis=0)
+        if plane == "Selection Bounds":
+            list_mesh = mc.listRelatives(list_transform,
+                                         allDescendents=True,
+                                         type="mesh",
+                                         noIntermediate=True,
+                                         fullPath=True) or []
+            if list_mesh:
+                points = np.concatenate([
+                    mesh_arrays.get_points(mesh_arrays.get_mesh_fn(i))
+                    for i in set(list_mesh)])
+                return weld_engine.fit_symmetry_plane(points, normal,
+                                                      tolerance)
+            bounds = mc.exactWorldBoundingBox(list_transform)
+            return np.add(bounds[:3], bounds[3:]) * 0.5
+        return np.zeros(3)
+
+    def group_instances(self, list_transform):
+
+        """
+        group transforms whose shapes are the same nodes (instances):
+        [(leader, [other transforms, ...]), ...] in selection order
+        """
+
+        dict_group = {}
+        list_key = []
+        for i in list_transform:
+            list_shape = mc.listRelatives(i,
+                                          shapes=True,
+                                          noIntermediate=True,
+                                          fullPath=True) or []
+            list_child = mc.listRelatives(i, type="transform") or []
+            if list_shape and not list_child:
+                key = tuple(sorted(mc.ls(list_shape, uuid=True)))
+            else:
+                # hierarchies are mirrored on their own
+                key = i
+            if key not in dict_group:
+                dict_group[key] = (i, [])
+                list_key.append(key)
+            else:
+                dict_group[key][1].append(i)
+        return [dict_group[i] for i in list_key]
+
+    def instance_mirror(self, mirror, list_other):
+
+        """
+        instance mirror's shapes once for each of list_other, next to them.
+        return the new transforms' dag paths
+        """
+
+        list_instance = []
+        for i in list_other:
+            instance = mc.ls(mc.instance(mirror)[0], long=True)[0]
+            parent = i.rsplit("|", 1)[0]
+            if parent != mirror.rsplit("|", 1)[0]:
+                # a dag path taken before the reparent would go stale
+                if parent:
+                    instance = mc.parent(instance, parent, relative=True)[0]
+                else:
+                    instance = mc.parent(instance, world=True,
+                                         relative=True)[0]
+                instance = mc.ls(instance, long=True)[0]
+            name = mc.rename(instance, i.split("|")[-1] + "_MIRROR")
+            # rename may return an ambiguous short name, build the path
+            instance = instance.rsplit("|", 1)[0] + "|" + name.split("|")[-1]
+            list_instance.append(mesh_arrays.get_dag_path(instance))
+        return list_instance
+
+    def mirror_geometry(self, list_mesh, reflection):
+
+        """ reflect meshes' points in world space, transforms stay as is """
+
+        if not list_mesh:
+            return
+        # reverse winding, and so normals, of every mesh in one call.
+        # duplicates have no history, nothing gets added
+        mc.polyNormal(list_mesh,
+                      normalMode=0,
+                      userNormalMode=0,
+                      constructionHistory=False)
+        for mesh in list_mesh:
+            mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+            world_matrix = self.to_array(mesh_fn.dagPath().inclusiveMatrix())
+            matrix = mirror_engine.local_reflection_matrix(world_matrix,
+                                                           reflection)
+            points = mesh_arrays.get_points(mesh_fn, om2.MSpace.kObject)
+            points = mirror_engine.transform_points(points, matrix)
+            # flip uvs in the same write instead of polyFlipUV
+            mesh_arrays.set_points_and_uvs(mesh_fn, points,
+                                           self.flip_uv_sets(mesh_fn))
+
+    def flip_uv_sets(self, mesh_fn):
+
+        """
+        return every uv set of a mesh flipped in u, as polyFlipUV would
+        do set by set: {uv set: (u, v)}
+        """
+
+        dict_uvs = {}
+        for uv_set in mesh_fn.getUVSetNames():
+            u, v = mesh_arrays.get_uvs(mesh_fn, uv_set)
+            dict_uvs[uv_set] = (mirror_engine.flip_u(u), v)
+        return dict_uvs
+
+    def list_weld_meshes(self, list_transform):
+
+        """
+        return the mesh shapes under list_transform that can be welded,
+        each shared shape once. Meshes with history are left out, their
+        upstream nodes would overwrite the weld
+        """
+
+        list_mesh = []
+        set_uuid = set()
+        for mesh in mc.listRelatives(list_transform,
+                                     allDescendents=True,
+                                     type="mesh",
+                                     noIntermediate=True,
+                                     fullPath=True) or []:
+            uuid = mc.ls(mesh, uuid=True)[0]
+            if uuid in set_uuid:
+                continue
+            set_uuid.add(uuid)
+            if mc.listConnections(mesh + ".inMesh",
+                                  source=True,
+                                  destination=False):
+                om.MGlobal.displayWarning(
+                    "{0} has history, delete it to weld.".format(mesh))
+                continue
+            list_mesh.append(mesh)
+        return list_mesh
+
+    def merge_geometry(self, list_mesh, reflection, tolerance):
+
+        """
+        weld into meshes their reflected copy along the seam, hard edges
+        included. tolerance is in world units
+        """
+
+        for mesh in list_mesh:
+            mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+            world_matrix = self.to_array(mesh_fn.dagPath().inclusiveMatrix())
+            matrix = mirror_engine.local_reflection_matrix(world_matrix,
+                                                           reflection)
+            # bring the tolerance into object space
+            scale = abs(np.linalg.det(world_matrix[:3, :3])) ** (1.0 / 3.0)
+            points = mesh_arrays.get_points(mesh_fn, om2.MSpace.kObject)
+            face_counts, face_vertices = mesh_arrays.get_face_vertices(
+                mesh_fn)
+            hard_edges = mesh_arrays.get_hard_edges(mesh_fn)
+            points, face_counts, face_vertices, vertex_map = \
+                weld_engine.mirror_merge(points, face_counts, face_vertices,
+                                         matrix,
+                                         tolerance / scale if scale
+                                         else tolerance)
+            list_data = []
+            for uv_set, u, v, counts, ids in mesh_arrays.get_uv_sets_data(
+                    mesh_fn):
+                u, v, counts, ids = weld_engine.mirror_merge_uvs(u, v,
+                                                                 counts, ids)
+                list_data.append((uv_set,
+                                  u.tolist(),
+                                  v.tolist(),
+                                  counts.tolist(),
+                                  ids.tolist()))
+            mesh_arrays.set_mesh_data(
+                mesh_fn, points, face_counts, face_vertices, list_data,
+                hard_edges=weld_engine.mirror_merge_edges(hard_edges,
+                                                          vertex_map))
+
+    def to_array(self, matrix):
+        return np.array(list(matrix)).reshape(4, 4)
+
+    def set_local_matrices(self, list_dag_path, local_matrices):
+
+        """ set transforms' local matrices in one undoable call """
+
+        list_old = []
+        list_new = []
+        for dag_path, matrix in zip(list_dag_path, local_matrices):
+            old = om2.MFnTransform(dag_path).transformation()
+            new = om2.MTransformationMatrix(om2.MMatrix(matrix.ravel()
+                                                        .tolist()))
+            # keep rotate order and pivots the way the original has them,
+            # balance=True moves translation so the matrix doesn't change
+            new.reorderRotation(old.rotationOrder())
+            new.setScalePivot(old.scalePivot(om2.MSpace.kTransform),
+                              om2.MSpace.kTransform, True)
+            new.setRotatePivot(old.rotatePivot(om2.MSpace.kTransform),
+                               om2.MSpace.kTransform, True)
+            list_old.append(old)
+            list_new.append(new)
+
+        def apply_transformations(list_transformation):
+            for dag_path, transformation in zip(list_dag_path,
+                                                list_transformation):
+                om2.MFnTransform(dag_path).setTransformation(transformation)
+
+        api_undo.commit(undo=lambda: apply_transformations(list_old),
+                        redo=lambda: apply_transformations(list_new))
 
     def showEvent(self, e):
         super(Mirrorer, self).showEvent(e)
@@ -0,0 +1,157 @@
+'''
+Summary:
+spatially stratified (blue-noise) picking used by tx Random Pick.
+
+Candidates are visited in random priority order and one is kept when no
+kept candidate lies closer than the minimum distance (Poisson-disk
+sample elimination). Instead of a python loop over the candidates, that
+greedy result is found in a few vectorized rounds: a candidate whose
+priority beats all its remaining neighbours is kept for sure, and its
+neighbours dropped. Neighbour pairs come from a uniform grid of
+min-distance sized cells.
+'''
+
+import numpy as np
+
+
+# the cell itself and half of its 26 neighbours, the other half is
+# covered from the neighbours' side
+_HALF_OFFSETS = [(x, y, z)
+                 for x in (-1, 0, 1)
+                 for y in (-1, 0, 1)
+                 for z in (-1, 0, 1)
+                 if (x, y, z) >= (0, 0, 0)]
+
+
+def neighbour_pairs(points, radius):
+    """
+    Return (index_a, index_b) of every pair of points closer than radius,
+    each pair once
+    """
+    points = np.asarray(points, dtype=np.float64)
+    empty = np.zeros(0, dtype=np.int64)
+    if len(points) < 2 or radius <= 0:
+        return empty, empty
+    cells = np.floor((points - points.min(axis=0)) / radius).astype(np.int64)
+    # one linear key per cell, with a margin so neighbour offsets don't wrap
+    shape = cells.max(axis=0) + 3
+    cells += 1
+    keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    order = np.argsort(keys, kind='mergesort')
+    # the points of every occupied cell are one run of order
+    cell_keys, cell_start, cell_size = np.unique(keys[order],
+                                                 return_index=True,
+                                                 return_counts=True)
+    list_a = []
+    list_b = []
+    for x, y, z in _HALF_OFFSETS:
+        # look cells up by cell, not by point: sorted and far fewer queries
+        keys_other = cell_keys + (x * shape[1] + y) * shape[2] + z
+        cell_other = np.minimum(np.searchsorted(cell_keys, keys_other),
+                                len(cell_keys) - 1)
+        found = np.nonzero(cell_keys[cell_other] == keys_other)[0]
+        cell_other = cell_other[found]
+        # every point of a cell against every point of the other cell
+        size_a = cell_size[found]
+        size_b = cell_size[cell_other]
+        num_pairs = size_a * size_b
+        cell_pair = np.repeat(np.arange(len(found)), num_pairs)
+        local = (np.arange(num_pairs.sum())
+                 - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs))
+        index_a = cell_start[found][cell_pair] + local // size_b[cell_pair]
+        index_b = cell_start[cell_other][cell_pair] + local % size_b[cell_pair]
+        if (x, y, z) == (0, 0, 0):
+            # pairs inside a cell, once each
+            is_pair = index_a < index_b
+            index_a = index_a[is_pair]
+            index_b = index_b[is_pair]
+        index_a = order[index_a]
+        index_b = order[index_b]
+        delta = points[index_a] - points[index_b]
+        close = np.einsum('ij,ij->i', delta, delta) < radius * radius
+        list_a.append(index_a[close])
+        list_b.append(index_b[close])
+    return np.concatenate(list_a), np.concatenate(list_b)
+
+
+def estimate_min_distance(points, num_pick):
+    """
+    Return a min distance letting about num_pick of the points be kept,
+    from the extent of their bounds (flat or linear bounds are measured
+    in 2 or 1 dimensions)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2 or num_pick <= 0:
+        return 0.0
+    extent = points.max(axis=0) - points.min(axis=0)
+    extent = extent[extent > extent.max() * 1e-3]
+    if not len(extent):
+        return 0.0
+    # random sequential disks fill a bit over half of the space, stay
+    # a little under that so enough candidates survive
+    measure = np.prod(extent) / num_pick
+    return 0.7 * measure ** (1.0 / len(extent))
+
+
+def poisson_pick(points, num_pick, min_distance, priorities=None,
+                 random_state=None):
+    """
+    Return up to num_pick sorted positions of points, no two of them closer
+    than min_distance. Fewer come back when the distance doesn't allow
+    num_pick. priorities: float per point, lower is visited first,
+    random by default
+    """
+    random_state = random_state or np.random
+    points = np.asarray(points, dtype=np.float64)
+    num_points = len(points)
+    if priorities is None:
+        priorities = random_state.random_sample(num_points)
+    # ranks make priorities unique, ties would stall the rounds
+    rank = np.empty(num_points, dtype=np.int64)
+    rank[np.lexsort((np.arange(num_points), priorities))] = \
+        np.arange(num_points)
+
+    index_a, index_b = neighbour_pairs(points, min_distance)
+    active = np.ones(num_points, dtype=bool)
+    kept = np.zeros(num_points, dtype=bool)
+    while active.any():
+        if len(index_a):
+            is_active = active[index_a] & active[index_b]
+            index_a = index_a[is_active]
+            index_b = index_b[is_active]
+        # lowest rank among each candidate's remaining neighbours
+        lowest = np.full(num_points, num_points, dtype=np.int64)
+        np.minimum.at(lowest, index_a, rank[index_b])
+        np.minimum.at(lowest, index_b, rank[index_a])
+        winner = active & (rank < lowest)
+        kept |= winner
+        active &= ~winner
+        # neighbours of the winners are out
+        active[index_b[winner[index_a]]] = False
+        active[index_a[winner[index_b]]] = False
+    kept = np.nonzero(kept)[0]
+    # the greedy order visits low ranks first, keep its first num_pick
+    if len(kept) > num_pick:
+        kept = kept[np.argsort(rank[kept], kind='mergesort')[:num_pick]]
+    return np.sort(kept)
+
+
+if __name__ == '__main__':
+    import time
+
+    state = np.random.RandomState(0)
+    for num_points in (10000, 100000, 500000):
+        # a scatter over terrain, 10% to keep
+        points = state.random_sample((num_points, 3)) * (1000.0, 0.0, 1000.0)
+        num_pick = num_points // 10
+        time_start = time.time()
+        min_distance = estimate_min_distance(points, num_pick)
+        picked = poisson_pick(points, num_pick, min_distance,
+                              random_state=state)
+        time_cost = time.time() - time_start
+        print("{0} candidates: {1} of {2} picked, "
+              "min distance {3:.2f} in {4:.3f}s".format(num_points,
+                                                        len(picked),
+                                                        num_pick,
+                                                        min_distance,
+                                                        time_cost))
@@ -3,12 +3,25 @@ import random
 import maya.cmds as mc
 import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
+import maya.api.OpenMaya as om2
 
 from PySide2 import QtCore
 from PySide2 import QtWidgets
 from PySide2 import QtGui
 from shiboken2 import wrapInstance
 
+from txmaya.general import api_undo
+from txmaya.general import lazy_module
+
+# numpy and the engines load on first use
+np = lazy_module.LazyModule("numpy")
+mesh_arrays = lazy_module.LazyModule("txmaya.modeling.mesh_arrays")
+poisson_pick = lazy_module.LazyModule("txmaya.modeling.poisson_pick")
+random_pick_engine = lazy_module.LazyModule(
+    "txmaya.modeling.random_pick_engine")
+selection_base = lazy_module.LazyModule("txmaya.modeling.selection_base")
+texel_density_engine = lazy_module.LazyModule(
+    "txmaya.modeling.texel_density_engine")
 
 __author__ = "Xiaowei Oscar Tan"
 __version__ = '1.0.2'
@@ -25,8 +38,11 @@ def maya_main_window():
 
 class RandomPick(QtWidgets.QDialog):
 
-    LIST_SEL_BASE = []
     COUNT_PICKED = 0
+    LIST_WEIGHT = ["Uniform",
+                   "Bounding Box Volume",
+                   "Surface Area",
+                   "Custom Attribute"]
 
     dialog_instance = None
 
@@ -56,6 +72,16 @@ class RandomPick(QtWidgets.QDialog):
                             ^ QtCore.Qt.WindowContextHelpButtonHint)
         # ui position
         self.geometry = None
+        # selection base, updated by deltas
+        self.sel_base = selection_base.SelectionBase()
+        self.selection_callback = None
+        # typing and selection changes come in bursts, refresh once settled
+        self.timer_track = QtCore.QTimer(self)
+        self.timer_track.setSingleShot(True)
+        self.timer_track.setInterval(100)
+        self.timer_display = QtCore.QTimer(self)
+        self.timer_display.setSingleShot(True)
+        self.timer_display.setInterval(150)
         # widgets and layouts
         self.create_widgets()
         self.create_layouts()
@@ -94,9 +120,36 @@ class RandomPick(QtWidgets.QDialog):
         self.line_count.setAlignment(QtCore.Qt.AlignRight)
         self.line_count.setValidator(QtGui.QIntValidator())
         self.line_count.setEnabled(False)
+        # weight
+        self.label_weight = QtWidgets.QLabel("Weight: ")
+        self.combo_weight = QtWidgets.QComboBox()
+        self.combo_weight.addItems(self.LIST_WEIGHT)
+        self.line_attr = QtWidgets.QLineEdit()
+        self.line_attr.setPlaceholderText("attribute")
+        self.line_attr.setMaximumWidth(100)
+        self.line_attr.setEnabled(False)
+        # spread
+        self.checkbox_spread = QtWidgets.QCheckBox("Spread Out, Min Dist: ")
+        self.checkbox_spread.setToolTip("Pick evenly spread items, "
+                                        "no two closer than the distance")
+        self.spin_distance = QtWidgets.QDoubleSpinBox()
+        self.spin_distance.setDecimals(3)
+        self.spin_distance.setRange(0.0, 1000000.0)
+        self.spin_distance.setSpecialValueText("Auto")
+        self.spin_distance.setEnabled(False)
+        # seed
+        self.label_seed = QtWidgets.QLabel("Seed: ")
+        self.spin_seed = QtWidgets.QSpinBox()
+        self.spin_seed.setRange(0, 2147483647)
+        self.spin_seed.setSpecialValueText("Random")
+        self.spin_seed.setToolTip("The same seed picks the same items, "
+                                  "whatever their selection order")
         # button
         self.btn_pick = QtWidgets.QPushButton("Random Pick")
         self.btn_refresh = QtWidgets.QPushButton("Refresh Selection Base")
+        self.checkbox_track = QtWidgets.QCheckBox("Track Selection")
+        self.checkbox_track.setToolTip("Follow selection changes as the "
+                                       "selection base, paused by a pick")
         # spacing
         # self.space = QtWidgets.QSpacerItem(20, 40)
 
@@ -121,6 +174,20 @@ class RandomPick(QtWidgets.QDialog):
         layout_count.addWidget(self.radio_count)
         layout_count.addLayout(layout_count_content)
 
+        layout_weight = QtWidgets.QHBoxLayout()
+        layout_weight.addWidget(self.label_weight)
+        layout_weight.addWidget(self.combo_weight)
+        layout_weight.addWidget(self.line_attr)
+
+        layout_spread = QtWidgets.QHBoxLayout()
+        layout_spread.addWidget(self.checkbox_spread)
+        layout_spread.addWidget(self.spin_distance)
+
+        layout_seed = QtWidgets.QHBoxLayout()
+        layout_seed.addWidget(self.label_seed)
+        layout_seed.addWidget(self.spin_seed)
+        layout_seed.addStretch()
+
         layout_print_content = QtWidgets.QGridLayout()
         layout_print_content.addWidget(self.label_base_count, 0, 0,
                                        QtCore.Qt.AlignRight)
@@ -136,6 +203,7 @@ class RandomPick(QtWidgets.QDialog):
         layout_print.addLayout(layout_print_content)
 
         layout_button_refresh = QtWidgets.QHBoxLayout()
+        layout_button_refresh.addWidget(self.checkbox_track)
         layout_button_refresh.addStretch()
         layout_button_refresh.addWidget(self.btn_refresh)
 
@@ -147,6 +215,9 @@ class RandomPick(QtWidgets.QDialog):
         layout_root = QtWidgets.QVBoxLayout(self)
         layout_root.addLayout(layout_percentage)
         layout_root.addLayout(layout_count)
+        layout_root.addLayout(layout_weight)
+        layout_root.addLayout(layout_spread)
+        layout_root.addLayout(layout_seed)
         layout_root.addLayout(layout_print)
         layout_root.addLayout(layout_button)
 
@@ -160,8 +231,13 @@ class RandomPick(QtWidgets.QDialog):
         self.radio_count.clicked.connect(self.disable_percentage)
         self.radio_count.clicked.connect(self.display_count_picked)
         # display
-        self.line_percentage.textChanged.connect(self.display_count_picked)
-        self.line_count.textChanged.connect(self.display_count_picked)
+        self.line_percentage.textChanged.connect(self.timer_display.start)
+        self.line_count.textChanged.connect(self.timer_display.start)
+        self.timer_display.timeout.connect(self.display_count_picked)
+        self.timer_track.timeout.connect(self.track_sel_base)
+        self.checkbox_track.toggled.connect(self.toggle_track)
+        self.combo_weight.currentIndexChanged.connect(self.update_line_attr)
+        self.checkbox_spread.toggled.connect(self.spin_distance.setEnabled)
         # other
         self.btn_refresh.clicked.connect(self.get_list_sel_base)
         self.btn_refresh.clicked.connect(self.display_count_sel_base)
@@ -178,6 +254,10 @@ class RandomPick(QtWidgets.QDialog):
         line_value = self.line_percentage.text()
         self.slider.setValue(int(line_value))
 
+    def update_line_attr(self):
+        self.line_attr.setEnabled(self.combo_weight.currentText()
+                                  == "Custom Attribute")
+
     def disable_percentage(self):
         self.line_percentage.setEnabled(False)
         self.slider.setEnabled(False)
@@ -191,7 +271,7 @@ class RandomPick(QtWidgets.QDialog):
     # method
     def display_count_sel_base(self):
         self.text_base_count.setText("<p style='color:#ffbc1f';><b>"
-                                     + str(len(self.LIST_SEL_BASE))
+                                     + str(self.get_count_sel_base())
                                      + "</b></p>")
 
     def display_count_picked(self):
@@ -201,25 +281,225 @@ class RandomPick(QtWidgets.QDialog):
                                      + "</b></p>")
 
     def get_list_sel_base(self):
-        self.LIST_SEL_BASE = mc.ls(sl=True, long=True) or []
+        self.sel_base.update_from_selection()
+
+    def get_count_sel_base(self):
+        return self.sel_base.count
+
+    def on_selection_changed(self, *args):
+        self.timer_track.start()
+
+    def track_sel_base(self):
+        num_added, num_removed = self.sel_base.update_from_selection()
+        if num_added or num_removed:
+            self.display_count_sel_base()
+            self.display_count_picked()
+
+    def toggle_track(self, checked):
+        if checked and self.selection_callback is None:
+            self.selection_callback = om2.MEventMessage.addEventCallback(
+                "SelectionChanged", self.on_selection_changed)
+            self.track_sel_base()
+        elif not checked and self.selection_callback is not None:
+            om2.MMessage.removeCallback(self.selection_callback)
+            self.selection_callback = None
+            self.timer_track.stop()
 
     def get_count_picked(self):
         if self.radio_percentage.isChecked():
-            percentage_picked = float(self.line_percentage.text())
-            self.COUNT_PICKED = int(round((percentage_picked / 100)
-                                          * len(self.LIST_SEL_BASE)))
+            percentage_picked = float(self.line_percentage.text() or 0)
+            self.COUNT_PICKED = random_pick_engine.pick_count(
+                self.get_count_sel_base(), percentage_picked)
         if self.radio_count.isChecked():
-            self.COUNT_PICKED = int(self.line_count.text())
+            self.COUNT_PICKED = int(self.line_count.text() or 0)
 
     def random_pick(self):
         self.get_count_picked()
 
-        if self.COUNT_PICKED <= len(self.LIST_SEL_BASE):
-            list_picked = random.sample(self.LIST_SEL_BASE,
-                                        k=self.COUNT_PICKED)
-            mc.select(list_picked)
-        else:
+        num_base = self.get_count_sel_base()
+        if self.COUNT_PICKED > num_base:
             om.MGlobal.displayWarning("Invald pick count input!")
+            return
+        weight = self.combo_weight.currentText()
+        if self.sel_base.has_components() and weight != "Uniform":
+            om.MGlobal.displayWarning("Weights only work on objects!")
+            return
+        weights = None
+        if weight != "Uniform":
+            weights = self.get_weights(weight)
+            if weights is None:
+                return
+        seed = self.spin_seed.value()
+        if not seed:
+            seed = random.randint(1, 2147483647)
+            om.MGlobal.displayInfo("Random pick seed: {0}".format(seed))
+        # every candidate's key only depends on its own id and the seed
+        if weights is None and not self.checkbox_spread.isChecked():
+            # uniform: keys streamed one item at a time
+            indices = random_pick_engine.reservoir_sample(
+                (random_pick_engine.stable_uniforms(ids, seed)
+                 for ids in self.sel_base.iter_ids()),
+                self.COUNT_PICKED)
+        else:
+            keys = random_pick_engine.stable_uniforms(self.sel_base.ids(),
+                                                      seed)
+            if weights is not None:
+                keys = random_pick_engine.weighted_keys(weights,
+                                                        uniforms=keys)
+            if self.checkbox_spread.isChecked():
+                indices = self.spread_pick(keys)
+                if indices is None:
+                    return
+            else:
+                indices = random_pick_engine.lowest_keys(keys,
+                                                         self.COUNT_PICKED)
+        if len(indices) < self.COUNT_PICKED:
+            om.MGlobal.displayWarning("Only {0} items could be "
+                                      "picked".format(len(indices)))
+        # the pick is a selection change too, keep the base
+        self.checkbox_track.setChecked(False)
+        self.select_picked(indices)
+
+    def spread_pick(self, keys):
+
+        """
+        pick evenly spread positions of the selection base, visited from
+        the lowest key up. None when the base has no positions
+        """
+
+        points = self.get_base_positions()
+        if points is None:
+            return None
+        min_distance = self.spin_distance.value()
+        if min_distance <= 0:
+            min_distance = poisson_pick.estimate_min_distance(
+                points, self.COUNT_PICKED)
+        indices = poisson_pick.poisson_pick(points, self.COUNT_PICKED,
+                                            min_distance, keys)
+        # weightless items only win where nothing else is around
+        return indices[np.isfinite(keys[indices])]
+
+    def get_base_positions(self):
+
+        """
+        return the world position of every selection base candidate:
+        pivots of objects, vertex positions and face centers. None when
+        some candidate has none
+        """
+
+        list_points = []
+        for item in self.sel_base.list_items():
+            dag_path = item.dag_path
+            if dag_path is None:
+                om.MGlobal.displayWarning("Only dag nodes can be spread out!")
+                return None
+            if item.elements is None:
+                if dag_path.hasFn(om2.MFn.kTransform):
+                    point = om2.MFnTransform(dag_path).rotatePivot(
+                        om2.MSpace.kWorld)
+                    list_points.append([[point.x, point.y, point.z]])
+                else:
+                    matrix = dag_path.inclusiveMatrix()
+                    list_points.append([[matrix[12], matrix[13],
+                                         matrix[14]]])
+                continue
+            mesh_fn = mesh_arrays.get_mesh_fn(dag_path.fullPathName())
+            points = mesh_arrays.get_points(mesh_fn)
+            if item.component_type == om2.MFn.kMeshVertComponent:
+                list_points.append(points[item.elements])
+            elif item.component_type == om2.MFn.kMeshPolygonComponent:
+                counts, indices = mesh_arrays.get_face_vertices(mesh_fn)
+                face = np.repeat(np.arange(len(counts)), counts)
+                centers = np.column_stack(
+                    [np.bincount(face, points[indices, i], len(counts))
+                     for i in range(3)]) / counts[:, None]
+                list_points.append(centers[item.elements])
+            else:
+                om.MGlobal.displayWarning("Only objects, vertices and faces "
+                                          "can be spread out!")
+                return None
+        if not list_points:
+            return np.zeros((0, 3))
+        return np.concatenate(list_points)
+
+    def select_picked(self, indices):
+
+        """
+        select the picked positions of the selection base. Components go
+        straight into component objects, nothing is turned into names
+        """
+
+        sel_picked = om2.MSelectionList()
+        list_items = self.sel_base.list_items()
+        for index, local in random_pick_engine.split_indices(
+                indices, self.sel_base.sizes()):
+            item = list_items[index]
+            if item.elements is None:
+                if item.dag_path is not None:
+                    sel_picked.add(item.dag_path)
+                else:
+                    sel_picked.add(item.node)
+                continue
+            component_fn = om2.MFnSingleIndexedComponent()
+            component = component_fn.create(item.component_type)
+            component_fn.addElements(item.elements[local].tolist())
+            sel_picked.add((item.dag_path, component))
+        sel_old = om2.MGlobal.getActiveSelectionList()
+        api_undo.commit(
+            undo=lambda: om2.MGlobal.setActiveSelectionList(sel_old),
+            redo=lambda: om2.MGlobal.setActiveSelectionList(sel_picked))
+
+    def get_weights(self, weight):
+
+        """
+        return a weight per selection base item, items without one get 0.
+        None when there is nothing to weight by
+        """
+
+        list_items = self.sel_base.list_items()
+        weights = np.zeros(len(list_items))
+        attr = self.line_attr.text().strip()
+        if weight == "Custom Attribute" and not attr:
+            om.MGlobal.displayWarning("Enter an attribute name!")
+            return None
+        for i, item in enumerate(list_items):
+            dag_path = item.dag_path
+            if weight == "Bounding Box Volume" and dag_path is not None:
+                box = om2.MFnDagNode(dag_path).boundingBox
+                matrix = np.array(list(dag_path.inclusiveMatrix()))
+                # the object space box's volume, scaled into world space
+                scale = abs(np.linalg.det(matrix.reshape(4, 4)[:3, :3]))
+                weights[i] = box.width * box.height * box.depth * scale
+            elif weight == "Surface Area" and dag_path is not None:
+                weights[i] = self.get_surface_area(dag_path)
+            elif weight == "Custom Attribute":
+                node_fn = om2.MFnDependencyNode(item.node)
+                if node_fn.hasAttribute(attr):
+                    weights[i] = node_fn.findPlug(attr, False).asDouble()
+        if not weights.any():
+            om.MGlobal.displayWarning("No item has a weight above 0!")
+            return None
+        return weights
+
+    def get_surface_area(self, dag_path):
+
+        """ return the world space area of every mesh under a dag path """
+
+        list_mesh = mc.listRelatives(dag_path.fullPathName(),
+                                     allDescendents=True,
+                                     type="mesh",
+                                     noIntermediate=True,
+                                     fullPath=True) or []
+        if dag_path.apiType() == om2.MFn.kMesh:
+            list_mesh.append(dag_path.fullPathName())
+        area = 0.0
+        for mesh in set(list_mesh):
+            mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+            points = mesh_arrays.get_points(mesh_fn)
+            counts, indices = mesh_arrays.get_face_vertices(mesh_fn)
+            area += texel_density_engine.face_areas_3d(points, counts,
+                                                       indices).sum()
+        return area
 
     def showEvent(self, e):
         super(RandomPick, self).showEvent(e)
@@ -232,6 +512,7 @@ class RandomPick(QtWidgets.QDialog):
             super(RandomPick, self).closeEvent(e)
 
             self.geometry = self.saveGeometry()
+            self.checkbox_track.setChecked(False)
 
 
 if __name__ == '__main__':
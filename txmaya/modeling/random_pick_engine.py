@@ -0,0 +1,201 @@
+'''
+Summary:
+sampling math used by tx Random Pick.
+
+Every sampler returns a sorted int64 array of picked positions into the
+candidates, never the candidates themselves, so picking from millions of
+items only costs a few arrays.
+
+Seeded picks hash every candidate's own id with the seed into a key and
+keep the lowest keys. A candidate's key doesn't depend on its position or
+on the other candidates, so the pick is the same whatever the order, and
+candidates split over several workers give the same result once their
+lowest keys are merged (see lowest_keys).
+'''
+
+import hashlib
+import itertools
+
+import numpy as np
+
+
+def pick_count(num_items, percentage):
+    """
+    Return how many of num_items a percentage (0-100) picks
+    """
+    return int(round(float(percentage) / 100.0 * num_items))
+
+
+def mix64(values):
+    """
+    Return the splitmix64 finalizer of uint64 values: a stable hash
+    scattering nearby values all over the 64 bits
+    """
+    with np.errstate(over='ignore'):
+        z = np.atleast_1d(np.asarray(values).astype(np.uint64))
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def hash_strings(list_string):
+    """
+    Return a stable uint64 hash per string (the first 8 bytes of its md5),
+    unlike hash() it is the same in every session
+    """
+    digests = b"".join(hashlib.md5(i.encode("utf-8")).digest()[:8]
+                       for i in list_string)
+    return np.frombuffer(digests, dtype="<u8").astype(np.uint64)
+
+
+def hash_indices(base_key, indices):
+    """
+    Return a stable uint64 hash per index under a base key, e.g. the
+    component indices of one mesh
+    """
+    return mix64(np.asarray(indices, dtype=np.int64).astype(np.uint64)
+                 ^ mix64(base_key)[0])
+
+
+def stable_uniforms(item_keys, seed):
+    """
+    Return a float in (0, 1) per uint64 item key, fixed by the seed
+    """
+    with np.errstate(over='ignore'):
+        z = mix64(np.asarray(item_keys, dtype=np.uint64) ^ mix64(seed)[0])
+    return ((z >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+
+def lowest_keys(keys, num_pick):
+    """
+    Return the sorted positions of the num_pick lowest finite keys.
+    With partitioned candidates, run it per partition, then once more
+    over the concatenated survivors: same pick as in one go
+    """
+    keys = np.asarray(keys, dtype=np.float64)
+    valid = np.nonzero(np.isfinite(keys))[0]
+    num_pick = max(0, min(int(num_pick), len(valid)))
+    if num_pick == len(valid):
+        return valid.astype(np.int64)
+    if num_pick == 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(keys[valid], num_pick - 1)[:num_pick]
+    return np.sort(valid[top].astype(np.int64))
+
+
+def weighted_keys(weights, random_state=None, uniforms=None):
+    """
+    Return a random key per item, -log(u) / weight: taking the lowest
+    keys picks items with probability proportional to their weights,
+    without replacement (Efraimidis-Spirakis).
+    Zero, negative or nan weights get an infinite key.
+    uniforms: u per item (e.g. stable_uniforms), drawn by default
+    """
+    random_state = random_state or np.random
+    weights = np.asarray(weights, dtype=np.float64)
+    if uniforms is None:
+        uniforms = 1.0 - random_state.random_sample(len(weights))
+    keys = np.full(len(weights), np.inf)
+    valid = weights > 0
+    keys[valid] = -np.log(np.asarray(uniforms)[valid]) / weights[valid]
+    return keys
+
+
+def reservoir_sample(iterable, num_pick, min_block=65536):
+    """
+    Return the sorted positions of the num_pick lowest finite keys of a
+    stream of key arrays (e.g. stable_uniforms of one selection item at a
+    time), positions counted over the whole stream. Only the reservoir
+    and a block of at least min_block incoming keys are held at a time.
+    With uniform keys it's a uniform pick without replacement
+    """
+    num_pick = max(0, int(num_pick))
+    reservoir_keys = np.zeros(0)
+    reservoir_positions = np.zeros(0, dtype=np.int64)
+    list_keys = []
+    num_pending = 0
+    offset = 0
+    for keys in itertools.chain(iterable, [None]):
+        if keys is not None:
+            keys = np.asarray(keys, dtype=np.float64)
+            list_keys.append(keys)
+            num_pending += len(keys)
+            # merge once a block outweighs the reservoir, not per array
+            if num_pending < max(num_pick, min_block):
+                continue
+        if not num_pending:
+            continue
+        block_keys = np.concatenate(list_keys)
+        block_positions = np.arange(offset, offset + num_pending,
+                                    dtype=np.int64)
+        offset += num_pending
+        all_keys = np.concatenate((reservoir_keys, block_keys))
+        all_positions = np.concatenate((reservoir_positions,
+                                        block_positions))
+        keep = lowest_keys(all_keys, num_pick)
+        reservoir_keys = all_keys[keep]
+        reservoir_positions = all_positions[keep]
+        list_keys = []
+        num_pending = 0
+    return np.sort(reservoir_positions)
+
+
+def split_indices(indices, sizes):
+    """
+    Map sorted positions over concatenated groups (sizes: candidates per
+    group) back to their groups.
+    Return [(group, positions inside the group), ...] for the groups
+    with picks
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    ends = np.cumsum(np.asarray(sizes, dtype=np.int64))
+    groups = np.searchsorted(ends, indices, side='right')
+    local = indices - (ends - sizes)[groups]
+    list_group, first = np.unique(groups, return_index=True)
+    return list(zip(list_group.tolist(), np.split(local, first[1:])))
+
+
+if __name__ == '__main__':
+    import time
+
+    num_items = 1000000
+    num_pick = pick_count(num_items, 10)
+    state = np.random.RandomState(0)
+
+    # 1M faces spread over 1000 meshes, streamed one mesh at a time
+    item_keys = hash_indices(hash_strings(["pPlaneShape1"])[0],
+                             np.arange(num_items))
+    sizes = np.full(1000, num_items // 1000)
+    list_keys = np.split(stable_uniforms(item_keys, 7), np.cumsum(sizes)[:-1])
+    time_start = time.time()
+    indices = reservoir_sample(iter(list_keys), num_pick)
+    split_indices(indices, sizes)
+    print("reservoir, {0} of {1}: {2:.3f}s".format(num_pick, num_items,
+                                                   time.time() - time_start))
+    print("reservoir pick matches: {0}".format(np.array_equal(
+        indices, lowest_keys(np.concatenate(list_keys), num_pick))))
+
+    weights = state.random_sample(num_items) ** 3
+    time_start = time.time()
+    lowest_keys(weighted_keys(weights, state), num_pick)
+    print("weighted, {0} of {1}: {2:.3f}s".format(num_pick, num_items,
+                                                  time.time() - time_start))
+
+    # the same seeded pick in one go and over 8 shuffled partitions
+    item_keys = hash_indices(hash_strings(["pPlaneShape1"])[0],
+                             np.arange(num_items))
+    time_start = time.time()
+    uniforms = stable_uniforms(item_keys, 42)
+    picked = item_keys[lowest_keys(uniforms, num_pick)]
+    print("seeded, {0} of {1}: {2:.3f}s".format(num_pick, num_items,
+                                                time.time() - time_start))
+    shuffled = state.permutation(item_keys)
+    list_survivor = []
+    for part in np.array_split(shuffled, 8):
+        part_uniforms = stable_uniforms(part, 42)
+        list_survivor.append(part[lowest_keys(part_uniforms, num_pick)])
+    survivors = np.concatenate(list_survivor)
+    merged = survivors[lowest_keys(stable_uniforms(survivors, 42), num_pick)]
+    print("partitioned pick matches: {0}".format(
+        np.array_equal(np.sort(picked), np.sort(merged))))
@@ -0,0 +1,159 @@
+'''
+Summary:
+selection base of tx Random Pick, kept up to date from selection deltas.
+
+Items are keyed by their compact selection strings (ls -sl without
+flatten: "pCube1", "pPlaneShape1.f[0:1999]"), so an update only resolves
+the strings that came in and drops the ones that went away, the rest of
+the base is kept as is, component indices and hashed ids included.
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from txmaya.modeling import random_pick_engine
+
+
+class SelectionBaseItem(object):
+
+    """
+    One selected object, or one run of components of a mesh
+    """
+
+    __slots__ = ("node", "dag_path", "component_type", "elements", "size",
+                 "ids")
+
+    def __init__(self, node, dag_path=None, component_type=None,
+                 elements=None):
+        self.node = node
+        self.dag_path = dag_path
+        self.component_type = component_type
+        self.elements = elements
+        self.size = 1 if elements is None else len(elements)
+        self.ids = None
+
+
+class SelectionBase(object):
+
+    """
+    Ordered, set-backed selection base with a running candidate count
+    """
+
+    def __init__(self):
+        self.items = OrderedDict()  # {selection string: SelectionBaseItem}
+        self.count = 0
+        self._list_items = None
+        self._sizes = None
+
+    def clear(self):
+        self.items = OrderedDict()
+        self.count = 0
+        self._list_items = None
+        self._sizes = None
+
+    def update(self, list_string):
+        """
+        Make the base hold exactly list_string, touching only the delta.
+        Return (num added candidates, num removed candidates)
+        """
+        set_string = set(list_string)
+        num_removed = 0
+        for string in [i for i in self.items if i not in set_string]:
+            num_removed += self.items.pop(string).size
+        num_added = 0
+        for string in list_string:
+            if string in self.items:
+                continue
+            item = self.resolve(string)
+            if item is not None:
+                self.items[string] = item
+                num_added += item.size
+        self.count += num_added - num_removed
+        if num_added or num_removed:
+            self._list_items = None
+            self._sizes = None
+        return num_added, num_removed
+
+    def update_from_selection(self):
+        """
+        Follow the active selection, see update
+        """
+        return self.update(mc.ls(sl=True, long=True) or [])
+
+    def resolve(self, string):
+        """
+        Return the SelectionBaseItem of a selection string, None when it
+        doesn't resolve to anything
+        """
+        sel = om2.MSelectionList()
+        try:
+            sel.add(string)
+        except RuntimeError:
+            return None
+        node = sel.getDependNode(0)
+        try:
+            dag_path, component = sel.getComponent(0)
+        except (TypeError, RuntimeError):
+            return SelectionBaseItem(node)
+        if component.isNull() or not component.hasFn(
+                om2.MFn.kSingleIndexedComponent):
+            return SelectionBaseItem(node, dag_path)
+        component_fn = om2.MFnSingleIndexedComponent(component)
+        return SelectionBaseItem(node, dag_path, component_fn.componentType,
+                                 np.array(component_fn.getElements(),
+                                          dtype=np.int64))
+
+    def list_items(self):
+        """
+        Return the items in base order, cached until the next change
+        """
+        if self._list_items is None:
+            self._list_items = list(self.items.values())
+        return self._list_items
+
+    def sizes(self):
+        """
+        Return the number of candidates of every item, in base order
+        """
+        if self._sizes is None:
+            self._sizes = np.array([i.size for i in self.list_items()],
+                                   dtype=np.int64)
+        return self._sizes
+
+    def has_components(self):
+        return any(i.elements is not None for i in self.list_items())
+
+    def ids(self):
+        """
+        Return a stable uint64 id per candidate, from node uuids and
+        component indices, independent of selection order. Items keep
+        their ids, only new ones get hashed
+        """
+        list_ids = list(self.iter_ids())
+        if not list_ids:
+            return np.zeros(0, dtype=np.uint64)
+        return np.concatenate(list_ids)
+
+    def iter_ids(self):
+        """
+        Yield the ids of one item at a time, in base order (see ids)
+        """
+        for item in self.list_items():
+            if item.ids is None:
+                item.ids = self.hash_item(item)
+            yield item.ids
+
+    def hash_item(self, item):
+        uuid = om2.MFnDependencyNode(item.node).uuid().asString()
+        if item.elements is None:
+            # instances share a node, tell them apart by dag path
+            if item.dag_path is not None and item.dag_path.isInstanced():
+                uuid += item.dag_path.fullPathName()
+            return random_pick_engine.hash_strings([uuid])
+        base_id = random_pick_engine.hash_strings(
+            ["{0}.{1}".format(uuid, item.component_type)])[0]
+        return random_pick_engine.hash_indices(base_id, item.elements)
@@ -0,0 +1,199 @@
+'''
+Summary:
+texel density audit over whole scenes.
+
+Walks every mesh of the open scene (or of a list of scene files), computes
+per-face or per-uv-shell texel density with texel_density_engine and reports
+a histogram, percentiles and the worst outliers as JSON or CSV.
+
+Meshes are streamed one at a time into a TexelDensityStats, so memory stays
+flat no matter how many assets a scene holds.
+
+Usage (mayapy):
+    mayapy -m txmaya.modeling.texel_density_audit scene_a.mb scene_b.ma
+        --map-size 2048 --mode shell --json audit.json --csv audit.csv
+'''
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from txmaya.modeling import mesh_arrays
+from txmaya.modeling import texel_density_engine
+
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def iter_meshes():
+    """
+    Yield the MDagPath of every non-intermediate mesh in the scene. An
+    instanced shape is yielded once, on the first path that reaches it,
+    so its faces count once however many times it is instanced
+    """
+    set_visited = set()
+    it_dag = om2.MItDag(om2.MItDag.kDepthFirst, om2.MFn.kMesh)
+    while not it_dag.isDone():
+        dag_path = it_dag.getPath()
+        dag_fn = om2.MFnDagNode(dag_path)
+        uuid = dag_fn.uuid().asString()
+        if not dag_fn.isIntermediateObject and uuid not in set_visited:
+            set_visited.add(uuid)
+            yield dag_path
+        it_dag.next()
+
+
+def mesh_texel_density(dag_path, map_size, mode="face"):
+    """
+    Return the TD of every face (mode "face") or uv shell (mode "shell")
+    of a mesh
+    """
+    mesh_fn = om2.MFnMesh(dag_path)
+    points = mesh_arrays.get_points(mesh_fn)
+    face_counts, face_vertices = mesh_arrays.get_face_vertices(mesh_fn)
+    u, v = mesh_arrays.get_uvs(mesh_fn)
+    uv_counts, uv_ids = mesh_arrays.get_assigned_uvs(mesh_fn)
+    area_3d = texel_density_engine.face_areas_3d(points,
+                                                 face_counts,
+                                                 face_vertices)
+    if mode == "shell":
+        _, shell_area_3d, shell_area_uv = \
+            texel_density_engine.shell_areas(u, v, area_3d,
+                                             uv_counts, uv_ids)
+        return texel_density_engine.face_texel_density(shell_area_3d,
+                                                       shell_area_uv,
+                                                       map_size)
+    area_uv = texel_density_engine.face_areas_uv(u, v, uv_counts, uv_ids)
+    return texel_density_engine.face_texel_density(area_3d, area_uv, map_size)
+
+
+def audit_scene(stats, map_size, mode="face", scene_label=""):
+    """
+    Add every mesh of the open scene to stats.
+    Return (num of meshes, num of values)
+    """
+    suffix = ".shell" if mode == "shell" else ".f"
+    num_meshes = 0
+    num_values = stats.count
+    for dag_path in iter_meshes():
+        td = mesh_texel_density(dag_path, map_size, mode)
+        label = dag_path.fullPathName() + suffix
+        if scene_label:
+            label = scene_label + ":" + label
+        stats.add(td, label)
+        num_meshes += 1
+    return num_meshes, stats.count - num_values
+
+
+def audit_scenes(list_scenes, map_size, mode="face", num_outliers=50):
+    """
+    Audit the open scene (empty list_scenes) or every scene file in turn.
+    Return the report dict
+    """
+    stats = texel_density_engine.TexelDensityStats(num_outliers=num_outliers)
+    list_scene_info = []
+    for scene in list_scenes or [None]:
+        time_start = time.time()
+        if scene:
+            mc.file(scene, open=True, force=True, prompt=False)
+        num_meshes, num_values = audit_scene(stats, map_size, mode,
+                                             scene_label=scene or "")
+        list_scene_info.append({"scene": scene or mc.file(q=True, sn=True),
+                                "meshes": num_meshes,
+                                "values": num_values,
+                                "seconds": round(time.time() - time_start,
+                                                 3)})
+    return build_report(stats, map_size, mode, list_scene_info)
+
+
+def build_report(stats, map_size, mode, list_scene_info):
+    """
+    Return a json friendly report dict of stats
+    """
+    return {"map_size": map_size,
+            "mode": mode,
+            "scenes": list_scene_info,
+            "count": stats.count,
+            "mean": stats.mean(),
+            "min": stats.min if stats.count else 0.0,
+            "max": stats.max if stats.count else 0.0,
+            "percentiles": dict(("p{0}".format(q), stats.percentile(q))
+                                for q in PERCENTILES),
+            "histogram": [{"low": low, "high": high, "count": count}
+                          for low, high, count in stats.histogram()],
+            "lowest": [{"item": label, "td": td}
+                       for td, label in stats.lowest],
+            "highest": [{"item": label, "td": td}
+                        for td, label in stats.highest]}
+
+
+def write_json(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def open_csv(path):
+    """
+    Open path for csv.writer: binary on python 2, text without newline
+    translation on python 3, so rows don't get blank lines on windows
+    """
+    if sys.version_info[0] < 3:
+        return open(path, "wb")
+    return open(path, "w", newline="")
+
+
+def write_csv(report, path):
+    """
+    Write the report as one long section,name,value table
+    """
+    with open_csv(path) as f:
+        writer = csv.writer(f)
+        writer.writerow(("section", "name", "value"))
+        for key in ("count", "mean", "min", "max"):
+            writer.writerow(("summary", key, report[key]))
+        for q in PERCENTILES:
+            name = "p{0}".format(q)
+            writer.writerow(("percentile", name, report["percentiles"][name]))
+        for i in report["histogram"]:
+            name = "{0:.6g}-{1:.6g}".format(i["low"], i["high"])
+            writer.writerow(("histogram", name, i["count"]))
+        for key in ("lowest", "highest"):
+            for i in report[key]:
+                writer.writerow((key, i["item"], i["td"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="tx texel density audit")
+    parser.add_argument("scenes", nargs="*",
+                        help="scene files, the open scene when empty")
+    parser.add_argument("--map-size", type=float, default=512)
+    parser.add_argument("--mode", choices=("face", "shell"), default="face")
+    parser.add_argument("--outliers", type=int, default=50,
+                        help="num of lowest / highest items to report")
+    parser.add_argument("--json", dest="path_json")
+    parser.add_argument("--csv", dest="path_csv")
+    args = parser.parse_args(argv)
+
+    report = audit_scenes(args.scenes, args.map_size, args.mode,
+                          args.outliers)
+    if args.path_json:
+        write_json(report, args.path_json)
+    if args.path_csv:
+        write_csv(report, args.path_csv)
+    if not args.path_json and not args.path_csv:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    return report
+
+
+if __name__ == '__main__':
+    import maya.standalone
+    maya.standalone.initialize()
+    try:
+        main()
+    finally:
+        maya.standalone.uninitialize()
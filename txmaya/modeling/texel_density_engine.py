@@ -0,0 +1,447 @@
+'''
+Summary:
+vectorized texel density math used by tx Texel Density Plus.
+
+Every function works on flat arrays (points, uvs and per-face counts/indices,
+the same layout maya's MFnMesh hands out), so a whole mesh is computed in one
+pass.
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+def face_offsets(face_counts):
+    """
+    Return the start index of every face in a flat face-vertex index array
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    offsets = np.zeros(len(face_counts), dtype=np.int64)
+    if len(face_counts) > 1:
+        np.cumsum(face_counts[:-1], out=offsets[1:])
+    return offsets
+
+
+def fan_triangles(face_counts, face_indices):
+    """
+    Fan-triangulate polygons given as flat counts/indices arrays.
+    Return (face id of each triangle, corner 0, corner 1, corner 2)
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_indices = np.asarray(face_indices, dtype=np.int64)
+    # faces with less than 3 corners (e.g. unmapped faces) give no triangle
+    tri_counts = np.maximum(face_counts - 2, 0)
+    tri_face = np.repeat(np.arange(len(face_counts)), tri_counts)
+    # position of each triangle inside its own face: 1 .. count-2
+    tri_first = np.zeros(len(face_counts), dtype=np.int64)
+    if len(face_counts) > 1:
+        np.cumsum(tri_counts[:-1], out=tri_first[1:])
+    tri_local = np.arange(len(tri_face)) - tri_first[tri_face] + 1
+    start = face_offsets(face_counts)[tri_face]
+    return (tri_face,
+            face_indices[start],
+            face_indices[start + tri_local],
+            face_indices[start + tri_local + 1])
+
+
+def face_areas_3d(points, face_counts, face_vertices):
+    """
+    Return the area of every face: its fan triangles from the first
+    vertex, signed along the face's Newell normal, so the triangles of a
+    concave face falling outside of it cancel out. points: (n, 3) array
+    """
+    points = np.asarray(points, dtype=np.float64)[:, :3]
+    tri_face, i0, i1, i2 = fan_triangles(face_counts, face_vertices)
+    p0 = points[i0]
+    cross = np.cross(points[i1] - p0, points[i2] - p0)
+    # the fan's cross products add up to the face's Newell normal
+    num_faces = len(face_counts)
+    normals = np.empty((num_faces, 3))
+    for axis in range(3):
+        normals[:, axis] = np.bincount(tri_face,
+                                       weights=cross[:, axis],
+                                       minlength=num_faces)
+    length = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    valid = length > 0
+    normals[valid] /= length[valid][:, None]
+    normals[~valid] = 0.0
+    area_tri = 0.5 * np.einsum('ij,ij->i', cross, normals[tri_face])
+    return np.bincount(tri_face, weights=area_tri, minlength=num_faces)
+
+
+def face_areas_uv(u, v, uv_counts, uv_ids):
+    """
+    Return the uv area of every face. Faces without uvs get 0
+    """
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    tri_face, i0, i1, i2 = fan_triangles(uv_counts, uv_ids)
+    cross = ((u[i1] - u[i0]) * (v[i2] - v[i0])
+             - (v[i1] - v[i0]) * (u[i2] - u[i0]))
+    area = np.bincount(tri_face, weights=cross, minlength=len(uv_counts))
+    return 0.5 * np.abs(area)
+
+
+def face_texel_density(area_3d, area_uv, map_size):
+    """
+    Return per-face texel density. Faces with no 3d area get nan
+    """
+    area_3d = np.asarray(area_3d, dtype=np.float64)
+    area_uv = np.asarray(area_uv, dtype=np.float64)
+    td = np.full(len(area_3d), np.nan)
+    valid = area_3d > 0
+    td[valid] = (np.sqrt(area_uv[valid])
+                 / np.sqrt(area_3d[valid])) * float(map_size)
+    return td
+
+
+def texel_density_sum(area_3d, area_uv, map_size, faces=None):
+    """
+    Return (sum of face TDs, num of faces) for the given faces of one mesh.
+    Partial sums let callers average across many meshes without
+    concatenating their arrays.
+    """
+    if faces is not None:
+        area_3d = np.asarray(area_3d)[faces]
+        area_uv = np.asarray(area_uv)[faces]
+    td = face_texel_density(area_3d, area_uv, map_size)
+    td = td[~np.isnan(td)]
+    return float(td.sum()), len(td)
+
+
+def average_texel_density(area_3d, area_uv, map_size, faces=None):
+    """
+    Return the average per-face texel density, 0.0 when nothing is valid
+    """
+    td_total, num_faces = texel_density_sum(area_3d, area_uv,
+                                            map_size, faces)
+    if num_faces == 0:
+        return 0.0
+    return td_total / num_faces
+
+
+def uv_sum(u, v, uv_ids=None):
+    """
+    Return (sum of u, sum of v, num of uvs) of the given uv ids.
+    Partial sums let callers get one pivot across many meshes.
+    """
+    if uv_ids is not None:
+        u = np.asarray(u)[uv_ids]
+        v = np.asarray(v)[uv_ids]
+    return float(np.sum(u)), float(np.sum(v)), len(u)
+
+
+def scale_uvs(u, v, scale_factor, pivot_u, pivot_v, uv_ids=None):
+    """
+    Return new (u, v) arrays with the given uv ids (all by default)
+    scaled around the pivot
+    """
+    u = np.array(u, dtype=np.float64)
+    v = np.array(v, dtype=np.float64)
+    if uv_ids is None:
+        uv_ids = slice(None)
+    u[uv_ids] = pivot_u + (u[uv_ids] - pivot_u) * scale_factor
+    v[uv_ids] = pivot_v + (v[uv_ids] - pivot_v) * scale_factor
+    return u, v
+
+
+def face_subset(face_counts, face_indices, faces):
+    """
+    Return (counts, flat indices) of only the given faces
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_indices = np.asarray(face_indices, dtype=np.int64)
+    sub_counts = face_counts[faces]
+    sub_first = np.zeros(len(sub_counts), dtype=np.int64)
+    if len(sub_counts) > 1:
+        np.cumsum(sub_counts[:-1], out=sub_first[1:])
+    corner_face = np.repeat(np.arange(len(sub_counts)), sub_counts)
+    corner_local = np.arange(len(corner_face)) - sub_first[corner_face]
+    start = face_offsets(face_counts)[faces]
+    return sub_counts, face_indices[start[corner_face] + corner_local]
+
+
+def union_find(num_items, pairs_a, pairs_b):
+    """
+    Group items linked by (pairs_a[i], pairs_b[i]) pairs.
+    Return the root item of every item.
+
+    Vectorized union-find: every round hooks the larger root of each pair
+    under the smaller one, then compresses paths by pointer jumping, until
+    no pair spans two roots.
+    """
+    parent = np.arange(num_items, dtype=np.int64)
+    pairs_a = np.asarray(pairs_a, dtype=np.int64)
+    pairs_b = np.asarray(pairs_b, dtype=np.int64)
+    while True:
+        root_a = parent[pairs_a]
+        root_b = parent[pairs_b]
+        split = root_a != root_b
+        if not split.any():
+            return parent
+        root_a = root_a[split]
+        root_b = root_b[split]
+        np.minimum.at(parent,
+                      np.maximum(root_a, root_b),
+                      np.minimum(root_a, root_b))
+        # pointer jumping until every item points at its root
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                break
+            parent = grand_parent
+        # only keep pairs that may still need a merge
+        pairs_a = pairs_a[split]
+        pairs_b = pairs_b[split]
+
+
+def uv_shells(num_uvs, uv_counts, uv_ids):
+    """
+    Return a shell id (0 .. num of shells - 1) for every uv,
+    -1 for uvs not used by any of the faces
+    """
+    uv_counts = np.asarray(uv_counts, dtype=np.int64)
+    uv_ids = np.asarray(uv_ids, dtype=np.int64)
+    # uvs of the same face belong to the same shell:
+    # link every corner to the face's first corner
+    first_uv = np.repeat(uv_ids[face_offsets(uv_counts)[uv_counts > 0]],
+                         uv_counts[uv_counts > 0])
+    root = union_find(num_uvs, first_uv, uv_ids)
+    used = np.zeros(num_uvs, dtype=bool)
+    used[uv_ids] = True
+    shell = np.full(num_uvs, -1, dtype=np.int64)
+    shell[used] = np.unique(root[used], return_inverse=True)[1]
+    return shell
+
+
+def shell_areas(u, v, area_3d, uv_counts, uv_ids):
+    """
+    Return (shell id of every uv, 3d area of every shell,
+    uv area of every shell)
+    """
+    uv_counts = np.asarray(uv_counts, dtype=np.int64)
+    uv_ids = np.asarray(uv_ids, dtype=np.int64)
+    area_3d = np.asarray(area_3d, dtype=np.float64)
+    area_uv = face_areas_uv(u, v, uv_counts, uv_ids)
+    shell = uv_shells(len(u), uv_counts, uv_ids)
+    num_shells = shell.max() + 1 if len(shell) else 0
+    # shell of each mapped face is the shell of its first uv
+    mapped = uv_counts > 0
+    face_shell = shell[uv_ids[face_offsets(uv_counts)[mapped]]]
+    shell_area_3d = np.bincount(face_shell,
+                                weights=area_3d[mapped],
+                                minlength=num_shells)
+    shell_area_uv = np.bincount(face_shell,
+                                weights=area_uv[mapped],
+                                minlength=num_shells)
+    return shell, shell_area_3d, shell_area_uv
+
+
+def normalize_uv_shells(u, v, area_3d, uv_counts, uv_ids,
+                        td_target, map_size, faces=None):
+    """
+    Scale every uv shell of the given faces (all by default) around its own
+    centroid so its texel density, sqrt(shell uv area / shell 3d area),
+    matches td_target. Return new (u, v) arrays.
+    """
+    u = np.array(u, dtype=np.float64)
+    v = np.array(v, dtype=np.float64)
+    area_3d = np.asarray(area_3d, dtype=np.float64)
+    if faces is not None:
+        uv_counts, uv_ids = face_subset(uv_counts, uv_ids, faces)
+        area_3d = area_3d[faces]
+    shell, shell_area_3d, shell_area_uv = shell_areas(u, v, area_3d,
+                                                      uv_counts, uv_ids)
+    num_shells = len(shell_area_3d)
+    if num_shells == 0:
+        return u, v
+    # leave shells without area alone
+    scale_factor = np.ones(num_shells)
+    valid = (shell_area_3d > 0) & (shell_area_uv > 0)
+    td_shell = face_texel_density(shell_area_3d[valid],
+                                  shell_area_uv[valid],
+                                  map_size)
+    scale_factor[valid] = float(td_target) / td_shell
+    # scale around each shell's uv centroid
+    in_shell = np.nonzero(shell >= 0)[0]
+    uv_shell = shell[in_shell]
+    num_shell_uvs = np.bincount(uv_shell, minlength=num_shells)
+    center_u = np.bincount(uv_shell, weights=u[in_shell],
+                           minlength=num_shells) / num_shell_uvs
+    center_v = np.bincount(uv_shell, weights=v[in_shell],
+                           minlength=num_shells) / num_shell_uvs
+    uv_scale = scale_factor[uv_shell]
+    u[in_shell] = (center_u[uv_shell]
+                   + (u[in_shell] - center_u[uv_shell]) * uv_scale)
+    v[in_shell] = (center_v[uv_shell]
+                   + (v[in_shell] - center_v[uv_shell]) * uv_scale)
+    return u, v
+
+
+class TexelDensityStats(object):
+
+    """
+    Streaming texel density statistics with bounded memory.
+
+    Values are added in batches (e.g. one mesh at a time) and only folded
+    into a fixed log2-spaced histogram, running totals and the num_outliers
+    lowest / highest values, so memory doesn't grow with the input.
+    Percentiles are read back from the histogram.
+    """
+
+    def __init__(self, bins_per_octave=8, octave_min=-10, octave_max=20,
+                 num_outliers=50):
+        num_bins = (octave_max - octave_min) * bins_per_octave
+        self.bin_edges = 2.0 ** np.linspace(octave_min, octave_max,
+                                            num_bins + 1)
+        # first and last bins also take values out of range
+        self.counts = np.zeros(num_bins, dtype=np.int64)
+        self.num_outliers = num_outliers
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.lowest = []  # [(td, label), ...] ascending
+        self.highest = []  # [(td, label), ...] descending
+
+    def add(self, td, label=""):
+        """
+        Add a batch of TD values. label: name prefix used for outliers,
+        the value's index in the batch is appended to it
+        """
+        td = np.asarray(td, dtype=np.float64)
+        td = td[np.isfinite(td)]
+        if len(td) == 0:
+            return
+        index = np.clip(np.searchsorted(self.bin_edges, td, side='right') - 1,
+                        0, len(self.counts) - 1)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        self.count += len(td)
+        self.total += float(td.sum())
+        self.min = min(self.min, float(td.min()))
+        self.max = max(self.max, float(td.max()))
+        # only the batch's own extremes can enter the outlier lists
+        k = min(self.num_outliers, len(td))
+        order = np.argsort(td)
+        self.lowest = sorted(self.lowest + self._labeled(td, order[:k], label)
+                             )[:self.num_outliers]
+        self.highest = sorted(self.highest
+                              + self._labeled(td, order[::-1][:k], label),
+                              reverse=True)[:self.num_outliers]
+
+    def _labeled(self, td, indices, label):
+        return [(float(td[i]), "{0}[{1}]".format(label, i)) for i in indices]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """
+        Return the approximate q-th percentile (0-100), interpolated
+        geometrically inside the histogram bin it falls in
+        """
+        if self.count == 0:
+            return 0.0
+        target = self.count * q / 100.0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, target))
+        index = min(index, len(self.counts) - 1)
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - before) / max(self.counts[index], 1)
+        low = self.bin_edges[index]
+        high = self.bin_edges[index + 1]
+        value = low * (high / low) ** min(max(fraction, 0.0), 1.0)
+        return float(min(max(value, self.min), self.max))
+
+    def histogram(self):
+        """
+        Return [(bin low, bin high, count), ...] of non-empty bins
+        """
+        return [(float(self.bin_edges[i]), float(self.bin_edges[i + 1]),
+                 int(self.counts[i]))
+                for i in np.nonzero(self.counts)[0]]
+
+
+class LruCache(object):
+
+    """
+    Least recently used cache bounded by the total size of its values
+    (e.g. num of faces), not by the num of entries.
+    on_evict(key, value) is called for every entry pushed out or popped.
+    """
+
+    def __init__(self, max_size, on_evict=None):
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self.size = 0
+        self._entries = OrderedDict()  # {key: (value, size)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        entry = self._entries.pop(key)
+        self._entries[key] = entry  # most recently used goes last
+        return entry[0]
+
+    def put(self, key, value, size=1):
+        self.pop(key)
+        self._entries[key] = (value, size)
+        self.size += size
+        # always keep the newest entry, even when it alone is too big
+        while self.size > self.max_size and len(self._entries) > 1:
+            self.pop(next(iter(self._entries)))
+
+    def pop(self, key):
+        if key not in self._entries:
+            return None
+        value, size = self._entries.pop(key)
+        self.size -= size
+        if self.on_evict:
+            self.on_evict(key, value)
+        return value
+
+    def clear(self):
+        for key in list(self._entries):
+            self.pop(key)
+
+
+def _make_grid_mesh(size):
+    """
+    Return a size x size quad grid as flat mesh arrays, for benchmarking
+    """
+    coords = np.arange(size + 1, dtype=np.float64)
+    xx, zz = np.meshgrid(coords, coords)
+    points = np.column_stack((xx.ravel(), np.zeros(xx.size), zz.ravel()))
+    row = np.arange(size)
+    corner = (row[None, :] + row[:, None] * (size + 1)).ravel()
+    face_vertices = np.column_stack((corner,
+                                     corner + 1,
+                                     corner + size + 2,
+                                     corner + size + 1)).ravel()
+    face_counts = np.full(size * size, 4)
+    u = points[:, 0] / size
+    v = points[:, 2] / size
+    return points, u, v, face_counts, face_vertices
+
+
+if __name__ == '__main__':
+    import time
+
+    for grid_size in (100, 500, 1415):
+        mesh = _make_grid_mesh(grid_size)
+        points, u, v, face_counts, face_vertices = mesh
+        time_start = time.time()
+        area_3d = face_areas_3d(points, face_counts, face_vertices)
+        area_uv = face_areas_uv(u, v, face_counts, face_vertices)
+        td = average_texel_density(area_3d, area_uv, 512)
+        time_cost = time.time() - time_start
+        print("{0} faces: TD {1:.4f} in {2:.3f}s".format(len(face_counts),
+                                                        td,
+                                                        time_cost))
@@ -1,15 +1,21 @@
-import math
-
 import maya.cmds as mc
-import pymel.core as pm
 import maya.OpenMaya as om
 import maya.OpenMayaUI as omui
+import maya.api.OpenMaya as om2
 
 from PySide2 import QtCore
 from PySide2 import QtWidgets
 from PySide2 import QtGui
 from shiboken2 import wrapInstance
 
+from txmaya.general import api_undo
+from txmaya.general import lazy_module
+
+# numpy and the engines load on first use
+mesh_arrays = lazy_module.LazyModule("txmaya.modeling.mesh_arrays")
+texel_density_engine = lazy_module.LazyModule(
+    "txmaya.modeling.texel_density_engine")
+
 __author__ = "Xiaowei Oscar Tan"
 __version__ = '2.0.2'
 
@@ -25,6 +31,9 @@ def maya_main_window():
 
 class TexelDensityPlus(QtWidgets.QDialog):
 
+    # max num of faces whose areas are kept in the cache
+    CACHE_MAX_FACES = 20000000
+
     dialog_instance = None
 
     @classmethod
@@ -49,6 +58,14 @@ class TexelDensityPlus(QtWidgets.QDialog):
                             ^ QtCore.Qt.WindowContextHelpButtonHint)
         # ui position
         self.geometry = None
+        # live TD: per-mesh face areas cache and maya callbacks
+        self.area_cache = texel_density_engine.LruCache(
+            self.CACHE_MAX_FACES, on_evict=self.on_cache_evict)
+        self.dirty_callbacks = {}  # {mesh: callback id}
+        self.selection_callback = None
+        self.timer_live = QtCore.QTimer(self)
+        self.timer_live.setSingleShot(True)
+        self.timer_live.setInterval(100)
         # widgets and layouts
         self.create_widgets()
         self.create_layouts()
@@ -68,6 +85,15 @@ class TexelDensityPlus(QtWidgets.QDialog):
         self.lineedit_map_size.setFixedWidth(45)
         self.lineedit_map_size.setValidator(QtGui.QIntValidator())
 
+        self.label_live_td = QtWidgets.QLabel("--")
+        self.checkbox_live = QtWidgets.QCheckBox("Live TD: ")
+        self.checkbox_live.setToolTip("Show selection's texel density "
+                                      "whenever the selection changes")
+
+        self.checkbox_shell = QtWidgets.QCheckBox("Per UV Shell")
+        self.checkbox_shell.setToolTip("Scale each UV shell around its own "
+                                       "center to the texel density")
+
     def create_layouts(self):
         layout_button = QtWidgets.QHBoxLayout()
         layout_button.addWidget(self.button_get)
@@ -82,9 +108,16 @@ class TexelDensityPlus(QtWidgets.QDialog):
         layout_td.addWidget(self.label_td)
         layout_td.addWidget(self.lineedit_td)
 
+        layout_option = QtWidgets.QHBoxLayout()
+        layout_option.addWidget(self.checkbox_live)
+        layout_option.addWidget(self.label_live_td)
+        layout_option.addStretch()
+        layout_option.addWidget(self.checkbox_shell)
+
         layout_root = QtWidgets.QVBoxLayout(self)
         layout_root.addLayout(layout_map_size)
         layout_root.addLayout(layout_td)
+        layout_root.addLayout(layout_option)
 
         layout_root.addSpacing(15)
         layout_root.addLayout(layout_button)
@@ -92,6 +125,8 @@ class TexelDensityPlus(QtWidgets.QDialog):
     def create_connections(self):
         self.button_get.clicked.connect(self.get_td)
         self.button_set.clicked.connect(self.set_td)
+        self.checkbox_live.toggled.connect(self.toggle_live_td)
+        self.timer_live.timeout.connect(self.display_live_td)
 
     # signals ans slots
     def calculate_td_sel_components(self):
@@ -100,80 +135,188 @@ class TexelDensityPlus(QtWidgets.QDialog):
 
         map_size = float(self.lineedit_map_size.text())
 
-        # convert selected components to faces
-        current_sel = pm.ls(sl=True)
-        if len(current_sel) > 0:
-            pm.select(d=True)
-            for i in current_sel:
-                pm.select(pm.polyListComponentConversion(i, toFace=True),
-                          add=True)
-            # get faces class
-            current_sel_faces = pm.ls(sl=True)
-            # calculate TD
-            num_faces = 0
-            td_faces_total = 0
-            for faces in current_sel_faces:
-                num_faces += len(faces)
-                for face in faces:
-                    face_area_uv = face.getUVArea()
-                    face_area_3d = face.getArea(space="world")
-                    td_face = (math.sqrt(face_area_uv)
-                               / math.sqrt(face_area_3d)) * map_size
-                    td_faces_total += td_face
-            td_faces = td_faces_total / num_faces
-            # convert selected components to uvs
-            current_sel_new = pm.ls(sl=True)
-            pm.select(d=True)
-            for j in current_sel_new:
-                pm.select(pm.polyListComponentConversion(j, toUV=True),
-                          add=True)
+        # convert selected components to faces, grouped per mesh
+        list_mesh_faces = mesh_arrays.get_selected_mesh_faces()
+        if len(list_mesh_faces) > 0:
+            td_faces, num_faces = self.calculate_td(list_mesh_faces, map_size)
+            if num_faces == 0:
+                om.MGlobal.displayWarning("Selected faces have no area!")
+                return 0.0000
             return round(td_faces, 4)
         else:
             om.MGlobal.displayWarning("Select at least 1 geo!")
             return 0.0000
 
+    def calculate_td(self, list_mesh_faces, map_size):
+
+        """ get (average TD, num of faces) of [(mesh, faces), ...] """
+
+        # one bulk read per mesh, cached ones are free
+        num_faces = 0
+        td_faces_total = 0
+        for mesh, faces in list_mesh_faces:
+            area_3d, area_uv = self.get_mesh_face_areas(mesh)
+            td_mesh_total, num_mesh_faces = \
+                texel_density_engine.texel_density_sum(area_3d,
+                                                       area_uv,
+                                                       map_size,
+                                                       faces)
+            td_faces_total += td_mesh_total
+            num_faces += num_mesh_faces
+        if num_faces == 0:
+            return 0.0, 0
+        return td_faces_total / num_faces, num_faces
+
+    def get_mesh_face_areas(self, mesh):
+
+        """ get 3d (world space) and uv areas of all faces of a mesh """
+
+        mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+        state = mesh_arrays.get_mesh_state(mesh_fn)
+        cached = self.area_cache.get(mesh)
+        if cached is not None and cached[0] == state:
+            return cached[1], cached[2]
+
+        points = mesh_arrays.get_points(mesh_fn)
+        face_counts, face_vertices = mesh_arrays.get_face_vertices(mesh_fn)
+        u, v = mesh_arrays.get_uvs(mesh_fn)
+        uv_counts, uv_ids = mesh_arrays.get_assigned_uvs(mesh_fn)
+        area_3d = texel_density_engine.face_areas_3d(points,
+                                                     face_counts,
+                                                     face_vertices)
+        area_uv = texel_density_engine.face_areas_uv(u, v, uv_counts, uv_ids)
+        self.area_cache.put(mesh, (state, area_3d, area_uv),
+                            size=len(area_3d))
+        # point and uv edits keep the state, drop the entry when they happen
+        if mesh not in self.dirty_callbacks:
+            self.dirty_callbacks[mesh] = \
+                om2.MNodeMessage.addNodeDirtyPlugCallback(mesh_fn.object(),
+                                                          self.on_mesh_dirty,
+                                                          mesh)
+        return area_3d, area_uv
+
+    # live TD
+    def on_mesh_dirty(self, node, plug, mesh):
+        if mesh in self.area_cache:
+            self.area_cache.pop(mesh)
+            if self.checkbox_live.isChecked():
+                self.timer_live.start()
+
+    def on_cache_evict(self, mesh, value):
+        callback_id = self.dirty_callbacks.pop(mesh, None)
+        if callback_id is not None:
+            om2.MMessage.removeCallback(callback_id)
+
+    def on_selection_changed(self, *args):
+        # selection changes come in bursts, only refresh once they settle
+        self.timer_live.start()
+
+    def toggle_live_td(self, checked):
+        if checked and self.selection_callback is None:
+            self.selection_callback = om2.MEventMessage.addEventCallback(
+                "SelectionChanged", self.on_selection_changed)
+            self.display_live_td()
+        elif not checked and self.selection_callback is not None:
+            om2.MMessage.removeCallback(self.selection_callback)
+            self.selection_callback = None
+            self.label_live_td.setText("--")
+
+    def display_live_td(self):
+        if not self.checkbox_live.isChecked():
+            return
+        map_size = float(self.lineedit_map_size.text() or 0)
+        list_mesh_faces = mesh_arrays.get_selected_mesh_faces()
+        td, num_faces = self.calculate_td(list_mesh_faces, map_size)
+        if num_faces == 0:
+            self.label_live_td.setText("--")
+        else:
+            self.label_live_td.setText(str(round(td, 4)))
+
+    def clear_live_td(self):
+        self.timer_live.stop()
+        self.checkbox_live.setChecked(False)
+        self.area_cache.clear()
+
     def uv_scale_sel_components(self, scale_factor):
 
         """ scale selected components' uv """
 
-        # convert selected components to uvs
-        current_sel = pm.ls(sl=True)
-        pm.select(d=True)
-        for i in current_sel:
-            pm.select(pm.polyListComponentConversion(i, toUV=True),
-                      add=True)
-        # get uvs class
-        current_sel_uvs = pm.ls(sl=True)
-        # get selected uvs' center
+        # convert selected components to uvs, grouped per mesh
+        list_mesh_uvs = mesh_arrays.get_selected_mesh_uvs()
+        # read every mesh's uvs once and get selected uvs' center
+        list_mesh_data = []
         num_uvs = 0
         uvs_center_u = 0
         uvs_center_v = 0
-        for uvs in current_sel_uvs:
-            num_uvs += len(uvs)
-            for uv in uvs:
-                uvs_center_u += pm.polyEditUV(uv, query=True)[0]
-                uvs_center_v += pm.polyEditUV(uv, query=True)[1]
+        for mesh, uv_ids in list_mesh_uvs:
+            mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+            u, v = mesh_arrays.get_uvs(mesh_fn)
+            sum_u, sum_v, num_mesh_uvs = \
+                texel_density_engine.uv_sum(u, v, uv_ids)
+            uvs_center_u += sum_u
+            uvs_center_v += sum_v
+            num_uvs += num_mesh_uvs
+            list_mesh_data.append((mesh_fn, u, v, uv_ids))
+        if num_uvs == 0:
+            return
         uvs_center_u = uvs_center_u / num_uvs
         uvs_center_v = uvs_center_v / num_uvs
-        # do scale
-        pm.polyEditUV(pivotU=uvs_center_u,
-                      pivotV=uvs_center_v,
-                      scaleU=scale_factor,
-                      scaleV=scale_factor)
+        # do scale, one write per mesh, all in one undo step
+        with api_undo.undo_chunk("txTexelDensity"):
+            for mesh_fn, u, v, uv_ids in list_mesh_data:
+                u_new, v_new = texel_density_engine.scale_uvs(u, v,
+                                                              scale_factor,
+                                                              uvs_center_u,
+                                                              uvs_center_v,
+                                                              uv_ids)
+                mesh_arrays.set_uvs(mesh_fn, u_new, v_new)
+
+    def uv_normalize_sel_shells(self, td_target):
+
+        """ scale selected components' uv shells to td_target one by one """
+
+        map_size = float(self.lineedit_map_size.text())
+
+        list_mesh_faces = mesh_arrays.get_selected_mesh_faces()
+        # one write per mesh no matter how many shells, all in one undo step
+        with api_undo.undo_chunk("txTexelDensity"):
+            for mesh, faces in list_mesh_faces:
+                mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+                points = mesh_arrays.get_points(mesh_fn)
+                face_counts, face_vertices = \
+                    mesh_arrays.get_face_vertices(mesh_fn)
+                u, v = mesh_arrays.get_uvs(mesh_fn)
+                uv_counts, uv_ids = mesh_arrays.get_assigned_uvs(mesh_fn)
+                area_3d = texel_density_engine.face_areas_3d(points,
+                                                             face_counts,
+                                                             face_vertices)
+                u_new, v_new = \
+                    texel_density_engine.normalize_uv_shells(u, v,
+                                                             area_3d,
+                                                             uv_counts,
+                                                             uv_ids,
+                                                             td_target,
+                                                             map_size,
+                                                             faces)
+                mesh_arrays.set_uvs(mesh_fn, u_new, v_new)
 
     def get_td(self):
         td = str(self.calculate_td_sel_components())
         self.lineedit_td.setText(td)
 
     def set_td(self):
-        current_sel = pm.ls(sl=True)
+        current_sel = mc.ls(sl=True, long=True) or []
         if len(current_sel) > 0:
             td_target = float(self.lineedit_td.text())
             if td_target == 0:
                 message = "'Texel Density' value can't be zero!"
                 om.MGlobal.displayWarning(message)
+            elif self.checkbox_shell.isChecked():
+                self.uv_normalize_sel_shells(td_target)
             else:
                 td_select = self.calculate_td_sel_components()
+                if td_select == 0:
+                    return
                 scale_factor = td_target / td_select
                 self.uv_scale_sel_components(scale_factor)
         else:
@@ -188,6 +331,8 @@ class TexelDensityPlus(QtWidgets.QDialog):
         if isinstance(self, TexelDensityPlus):
             super(TexelDensityPlus, self).closeEvent(e)
             self.geometry = self.saveGeometry()
+            # don't leave callbacks behind in maya
+            self.clear_live_td()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+'''
+Summary:
+tx UV Batch Transfer logic without any UI, shared by the dialog
+(uv_batch_transfer) and the headless batch (uv_batch_headless).
+'''
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+from txmaya.modeling import mesh_arrays
+from txmaya.modeling import uv_batch_match
+
+
+def list_meshes(list_nodes):
+    """
+    Return full paths of all non-intermediate mesh shapes under the nodes
+    """
+    list_dag = mc.ls(list_nodes, long=True, dag=True) or []
+    return mc.listRelatives(list_dag,
+                            shapes=True,
+                            type="mesh",
+                            noIntermediate=True,
+                            fullPath=True) or []
+
+
+class FingerprintCache(object):
+
+    """
+    Topology fingerprints per mesh shape. With watch on, a dirty callback
+    per shape drops its fingerprint when the incoming mesh changes;
+    call clear() to remove the callbacks.
+    """
+
+    def __init__(self, watch=True):
+        self.watch = watch
+        self.fingerprints = {}  # {mesh: (counts, fingerprint)}
+        self.dirty_callbacks = {}  # {mesh: callback id}
+
+    def get(self, mesh):
+        mesh_fn = mesh_arrays.get_mesh_fn(mesh)
+        counts = (mesh_fn.numVertices,
+                  mesh_fn.numPolygons,
+                  mesh_fn.numFaceVertices)
+        cached = self.fingerprints.get(mesh)
+        if cached is not None and cached[0] == counts:
+            return cached[1]
+        face_counts, face_vertices = mesh_arrays.get_face_vertices(mesh_fn)
+        fingerprint = uv_batch_match.topology_fingerprint(mesh_fn.numVertices,
+                                                          face_counts,
+                                                          face_vertices)
+        self.fingerprints[mesh] = (counts, fingerprint)
+        if self.watch and mesh not in self.dirty_callbacks:
+            self.dirty_callbacks[mesh] = \
+                om2.MNodeMessage.addNodeDirtyPlugCallback(mesh_fn.object(),
+                                                          self.on_mesh_dirty,
+                                                          mesh)
+        return fingerprint
+
+    def on_mesh_dirty(self, node, plug, mesh):
+        # topology only changes through the incoming mesh, uv and
+        # point edits leave the fingerprint valid
+        if plug.partialName() == "i":
+            self.fingerprints.pop(mesh, None)
+
+    def clear(self):
+        for callback_id in self.dirty_callbacks.values():
+            om2.MMessage.removeCallback(callback_id)
+        self.dirty_callbacks = {}
+        self.fingerprints = {}
+
+
+def plan_transfer(list_mesh, suffix_source, suffix_target, separator,
+                  fingerprint_of):
+    """
+    Pair meshes by name and check their topology before any edit.
+    Return (MatchResult, [(source, target), ...] pairs to transfer,
+    [(source, target), ...] topology mismatches)
+    """
+    result = uv_batch_match.match_pairs(
+        list_mesh,
+        uv_batch_match.make_suffix_rule(suffix_source, separator),
+        uv_batch_match.make_suffix_rule(suffix_target, separator))
+    dict_mesh, list_mismatch = uv_batch_match.preflight(result.pairs,
+                                                        fingerprint_of)
+    return result, sorted(dict_mesh.items()), list_mismatch
+
+
+def transfer_pair(source, target, direct=True):
+    """
+    Transfer all uv sets of source onto target, which must share its
+    topology. direct: write the uv arrays without history, otherwise
+    go through polyTransfer
+    """
+    if direct:
+        source_fn = mesh_arrays.get_mesh_fn(source)
+        target_fn = mesh_arrays.get_mesh_fn(target)
+        mesh_arrays.set_uv_sets_data(target_fn,
+                                     mesh_arrays.get_uv_sets_data(source_fn),
+                                     source_fn.currentUVSetName())
+        return
+    mc.polyTransfer(target,
+                    vertices=0,
+                    vertexColor=0,
+                    uvSets=1,
+                    alternateObject=source)
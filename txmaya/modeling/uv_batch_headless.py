@@ -0,0 +1,332 @@
+'''
+Summary:
+headless tx UV Batch Transfer over many scene files.
+
+"run" fans the scene files out over a pool of worker processes, each one a
+standalone mayapy running "worker" on one file: every mesh of the scene is
+paired by suffixes, checked by topology and transferred, then the scene is
+saved. Per-file results and timings are gathered into one JSON report.
+
+The scheduling side doesn't import maya, any command line can stand in for
+the worker (see build_worker_command / run_pool).
+
+Usage:
+    mayapy -m txmaya.modeling.uv_batch_headless run shot_*.mb
+        --source src --target tgt --workers 8 --report report.json
+'''
+
+import argparse
+import errno
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+
+# txmaya's parent folder, so workers can import the package
+PATH_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+
+def build_worker_command(mayapy, scene, path_result, args):
+    """
+    Return the command line running one worker on one scene file
+    """
+    command = [mayapy, "-m", "txmaya.modeling.uv_batch_headless", "worker",
+               scene,
+               "--result", path_result,
+               "--source", args.source,
+               "--target", args.target,
+               "--separator", args.separator,
+               "--chunk", str(args.chunk)]
+    if args.polytransfer:
+        command.append("--polytransfer")
+    if args.output_dir:
+        command.extend(["--output-dir", args.output_dir,
+                        "--input-root", args.input_root])
+    if args.dry_run:
+        command.append("--dry-run")
+    return command
+
+
+def common_root(list_scenes):
+    """
+    Return the deepest folder holding every scene file
+    """
+    list_parts = [os.path.dirname(os.path.abspath(i)).split(os.sep)
+                  for i in list_scenes]
+    return os.sep.join(os.path.commonprefix(list_parts)) or os.sep
+
+
+def output_path(scene, output_dir, input_root):
+    """
+    Return where scene is saved under output_dir: its path relative to
+    input_root, so same-named scenes of different folders stay apart
+    """
+    path_rel = os.path.relpath(os.path.abspath(scene),
+                               os.path.abspath(input_root))
+    if path_rel.split(os.sep)[0] == os.pardir:
+        raise ValueError("{0} is outside of {1}".format(scene, input_root))
+    return os.path.join(output_dir, path_rel)
+
+
+def make_dirs(path_dir):
+    """
+    Create path_dir and its parents, fine when another process just did
+    """
+    try:
+        os.makedirs(path_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path_dir):
+            raise
+
+
+def run_worker(command, path_result, timeout=None):
+    """
+    Run one worker process and return its result dict, with the exit code,
+    wall time and tail of its output added
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        i for i in (PATH_PACKAGE_ROOT, env.get("PYTHONPATH")) if i)
+    time_start = time.time()
+    process = subprocess.Popen(command,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               env=env)
+    if timeout:
+        # python 2 has no Popen timeout, kill it from a timer
+        import threading
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        output = process.communicate()[0]
+        timer.cancel()
+    else:
+        output = process.communicate()[0]
+    result = {}
+    if os.path.isfile(path_result):
+        with open(path_result) as f:
+            result = json.load(f)
+    result["returncode"] = process.returncode
+    result["seconds"] = round(time.time() - time_start, 3)
+    result["ok"] = process.returncode == 0 and result.get("error") is None
+    if not result["ok"]:
+        output = output.decode("utf-8", "replace") if output else ""
+        result["output"] = output[-2000:]
+    return result
+
+
+def run_pool(list_scenes, make_command, workers=4, timeout=None,
+             on_result=None):
+    """
+    Run make_command(scene, path_result) for every scene over a pool of
+    `workers` processes. on_result(result) is called as each one finishes.
+    Return the report dict
+    """
+    dir_temp = tempfile.mkdtemp(prefix="txUvBatchHeadless_")
+    time_start = time.time()
+
+    def run_one(indexed_scene):
+        index, scene = indexed_scene
+        path_result = os.path.join(dir_temp, "{0}.json".format(index))
+        result = run_worker(make_command(scene, path_result),
+                            path_result,
+                            timeout)
+        result["scene"] = scene
+        return result
+
+    list_results = []
+    pool = ThreadPool(max(1, workers))
+    try:
+        for result in pool.imap_unordered(run_one, enumerate(list_scenes)):
+            list_results.append(result)
+            if on_result is not None:
+                on_result(result)
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(dir_temp, ignore_errors=True)
+    return build_report(list_results, time.time() - time_start, workers)
+
+
+def build_report(list_results, seconds, workers):
+    """
+    Return the aggregated report of per-file results
+    """
+    list_results = sorted(list_results, key=lambda i: i["scene"])
+    list_failed = [i["scene"] for i in list_results if not i["ok"]]
+    totals = {}
+    for key in ("pairs", "transferred", "mismatched", "unmatched",
+                "ambiguous"):
+        totals[key] = sum(i.get(key, 0) for i in list_results)
+    num_files = len(list_results)
+    return {"files": num_files,
+            "failed": list_failed,
+            "workers": workers,
+            "seconds": round(seconds, 3),
+            "files_per_second": round(num_files / seconds, 3)
+            if seconds > 0 else 0.0,
+            "totals": totals,
+            "results": list_results}
+
+
+def worker_main(args):
+    """
+    Transfer uvs in one scene file and write its result dict as json.
+    Runs inside mayapy
+    """
+    result = {"scene": args.scene, "error": None}
+    time_start = time.time()
+    import maya.standalone
+    maya.standalone.initialize()
+    try:
+        import maya.cmds as mc
+        from txmaya.general import chunked_job
+        from txmaya.modeling import uv_batch_core
+
+        mc.file(args.scene, open=True, force=True, prompt=False)
+        result["seconds_open"] = round(time.time() - time_start, 3)
+        # nobody will undo in batch, don't pay for it
+        mc.undoInfo(stateWithoutFlush=False)
+
+        list_mesh = uv_batch_core.list_meshes(mc.ls(assemblies=True))
+        fingerprints = uv_batch_core.FingerprintCache(watch=False)
+        match, list_pairs, list_mismatch = uv_batch_core.plan_transfer(
+            list_mesh, args.source, args.target, args.separator,
+            fingerprints.get)
+        result["pairs"] = len(match.pairs)
+        result["mismatched"] = len(list_mismatch)
+        result["unmatched"] = (len(match.unmatched_sources)
+                               + len(match.unmatched_targets))
+        result["ambiguous"] = len(match.ambiguous)
+        result["mismatch_pairs"] = list_mismatch
+        if args.dry_run:
+            result["transferred"] = 0
+        else:
+            direct = not args.polytransfer
+            job = chunked_job.ChunkedJob(
+                list_pairs,
+                lambda pair: uv_batch_core.transfer_pair(pair[0], pair[1],
+                                                         direct),
+                chunk_size=args.chunk)
+            job_result = job.run()
+            result["transferred"] = job_result.num_done
+            if job_result.error is not None:
+                raise job_result.error
+            result["seconds_transfer"] = round(job_result.seconds, 3)
+            # save
+            if args.output_dir:
+                path_out = output_path(args.scene, args.output_dir,
+                                       args.input_root or
+                                       os.path.dirname(args.scene))
+                make_dirs(os.path.dirname(path_out))
+                mc.file(rename=path_out)
+            mc.file(save=True, force=True)
+            result["saved"] = mc.file(q=True, sceneName=True)
+    except Exception as e:
+        result["error"] = "{0}: {1}".format(type(e).__name__, e)
+    finally:
+        result["seconds_worker"] = round(time.time() - time_start, 3)
+        with open(args.result, "w") as f:
+            json.dump(result, f, indent=2)
+        maya.standalone.uninitialize()
+    return 0 if result["error"] is None else 1
+
+
+def add_transfer_arguments(parser):
+    parser.add_argument("--source", required=True,
+                        help="source geos suffix")
+    parser.add_argument("--target", required=True,
+                        help="target geos suffix")
+    parser.add_argument("--separator", default="_",
+                        help="separator before the suffix")
+    parser.add_argument("--chunk", type=int, default=500,
+                        help="pairs per chunk")
+    parser.add_argument("--polytransfer", action="store_true",
+                        help="go through polyTransfer instead of "
+                             "direct uv copy")
+    parser.add_argument("--output-dir",
+                        help="save into this folder instead of in place")
+    parser.add_argument("--input-root",
+                        help="with --output-dir, scenes keep their path "
+                             "relative to this folder, the common folder "
+                             "of all scenes by default")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only pair and check topology, don't save")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="tx UV Batch Transfer over scene files")
+    subparsers = parser.add_subparsers(dest="mode")
+
+    parser_run = subparsers.add_parser("run", help="schedule scene files")
+    parser_run.add_argument("scenes", nargs="+",
+                            help="scene files or glob patterns")
+    add_transfer_arguments(parser_run)
+    parser_run.add_argument("--workers", type=int, default=4)
+    parser_run.add_argument("--timeout", type=float,
+                            help="seconds before a worker is killed")
+    parser_run.add_argument("--mayapy", default=sys.executable,
+                            help="mayapy used by the workers")
+    parser_run.add_argument("--report", help="json report path")
+
+    parser_worker = subparsers.add_parser("worker",
+                                          help="process one scene file")
+    parser_worker.add_argument("scene")
+    parser_worker.add_argument("--result", required=True,
+                               help="json result path")
+    add_transfer_arguments(parser_worker)
+
+    args = parser.parse_args(argv)
+    if args.mode == "worker":
+        return worker_main(args)
+
+    list_scenes = []
+    for pattern in args.scenes:
+        list_scenes.extend(sorted(glob.glob(pattern)) or [pattern])
+    if args.output_dir:
+        # two workers must never save over each other's scene
+        if not args.input_root:
+            args.input_root = common_root(list_scenes)
+        dict_out = {}
+        for scene in list_scenes:
+            try:
+                path_out = output_path(scene, args.output_dir,
+                                       args.input_root)
+            except ValueError as e:
+                parser.error(str(e))
+            if path_out in dict_out:
+                parser.error("{0} and {1} would both be saved as {2}".format(
+                    dict_out[path_out], scene, path_out))
+            dict_out[path_out] = scene
+        # before the workers start, they would race over new folders
+        for path_dir in sorted(set(os.path.dirname(i) for i in dict_out)):
+            make_dirs(path_dir)
+
+    def on_result(result):
+        state = "ok" if result["ok"] else "FAILED"
+        print("{0}  {1}  {2}s".format(state, result["scene"],
+                                      result["seconds"]))
+
+    report = run_pool(list_scenes,
+                      lambda scene, path_result: build_worker_command(
+                          args.mayapy, scene, path_result, args),
+                      workers=args.workers,
+                      timeout=args.timeout,
+                      on_result=on_result)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
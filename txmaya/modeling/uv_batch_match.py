@@ -0,0 +1,141 @@
+'''
+Summary:
+pairing source and target geos by name for tx UV Batch Transfer.
+
+Every name is parsed once by a suffix rule into a key (its prefix), then
+sources and targets are joined on exact keys through dictionaries, so
+"rock_1" never pairs with "rock_10" and the cost stays linear.
+Pairs are then checked with topology fingerprints before any edit.
+'''
+
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+
+
+MatchResult = namedtuple("MatchResult", ["pairs",
+                                         "unmatched_sources",
+                                         "unmatched_targets",
+                                         "ambiguous"])
+
+
+def short_name(path):
+    """
+    Return the transform's short name, without namespace, of a shape's
+    full path ("|grp|ns:rock_1_src|rock_1_srcShape" -> "rock_1_src")
+    """
+    list_path = path.split("|")
+    name = list_path[-2] if len(list_path) > 1 else list_path[-1]
+    return name.rsplit(":", 1)[-1]
+
+
+def make_suffix_rule(suffix, separator="_"):
+    """
+    Return a rule: name -> prefix when the name ends with separator + suffix,
+    None otherwise. An empty suffix matches nothing.
+    """
+    ending = separator + suffix
+
+    def rule(name):
+        if suffix and name.endswith(ending) and len(name) > len(ending):
+            return name[:-len(ending)]
+        return None
+
+    return rule
+
+
+def group_by_key(list_paths, rule):
+    """
+    Return {key: [path, ...]} of the paths the rule gives a key to
+    """
+    dict_key = {}
+    for path in list_paths:
+        key = rule(short_name(path))
+        if key is not None:
+            dict_key.setdefault(key, []).append(path)
+    return dict_key
+
+
+def match_pairs(list_paths, source_rule, target_rule):
+    """
+    Pair source and target paths whose keys are equal.
+
+    Return a MatchResult:
+        pairs: {source: target}
+        unmatched_sources / unmatched_targets: sorted lists of paths
+        ambiguous: {key: (sources, targets)} where a key has more than
+                   one source or target, left out of pairs
+    """
+    dict_source = group_by_key(list_paths, source_rule)
+    dict_target = group_by_key(list_paths, target_rule)
+    pairs = {}
+    ambiguous = {}
+    unmatched_sources = []
+    for key, sources in dict_source.items():
+        targets = dict_target.get(key)
+        if targets is None:
+            unmatched_sources.extend(sources)
+        elif len(sources) > 1 or len(targets) > 1:
+            ambiguous[key] = (sources, targets)
+        else:
+            pairs[sources[0]] = targets[0]
+    unmatched_targets = [path
+                         for key, targets in dict_target.items()
+                         if key not in dict_source
+                         for path in targets]
+    return MatchResult(pairs,
+                       sorted(unmatched_sources),
+                       sorted(unmatched_targets),
+                       ambiguous)
+
+
+def topology_fingerprint(num_vertices, face_counts, face_vertices):
+    """
+    Return a hex digest of a mesh's topology: vertex / face counts and
+    the face-vertex count and index arrays. Equal digests mean the
+    meshes share the same layout.
+    """
+    face_counts = np.ascontiguousarray(face_counts, dtype='<i4')
+    face_vertices = np.ascontiguousarray(face_vertices, dtype='<i4')
+    digest = hashlib.sha1()
+    digest.update(np.array([num_vertices, len(face_counts)],
+                           dtype='<i8').tobytes())
+    digest.update(face_counts.tobytes())
+    digest.update(face_vertices.tobytes())
+    return digest.hexdigest()
+
+
+def preflight(pairs, fingerprint_of):
+    """
+    Compare the fingerprints of every {source: target} pair in one pass.
+    fingerprint_of(path) returns a path's fingerprint.
+    Return (matching pairs, [(source, target), ...] mismatching pairs)
+    """
+    pairs_ok = {}
+    list_mismatch = []
+    for source, target in pairs.items():
+        if fingerprint_of(source) == fingerprint_of(target):
+            pairs_ok[source] = target
+        else:
+            list_mismatch.append((source, target))
+    return pairs_ok, sorted(list_mismatch)
+
+
+if __name__ == '__main__':
+    import time
+
+    for num_pieces in (1000, 10000, 100000):
+        list_paths = []
+        for i in range(num_pieces):
+            list_paths.append("|src_grp|rock_{0}_src|rock_{0}_srcShape"
+                              .format(i))
+            list_paths.append("|tgt_grp|rock_{0}_tgt|rock_{0}_tgtShape"
+                              .format(i))
+        time_start = time.time()
+        result = match_pairs(list_paths,
+                             make_suffix_rule("src"),
+                             make_suffix_rule("tgt"))
+        time_cost = time.time() - time_start
+        print("{0} pairs matched in {1:.3f}s".format(len(result.pairs),
+                                                     time_cost))
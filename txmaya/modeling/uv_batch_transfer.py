@@ -15,6 +15,13 @@ from PySide2 import QtCore
 from PySide2 import QtWidgets
 from shiboken2 import wrapInstance
 
+from txmaya.general import api_undo
+from txmaya.general import chunked_job
+from txmaya.general import lazy_module
+
+# numpy and the engines load on first use
+uv_batch_core = lazy_module.LazyModule("txmaya.modeling.uv_batch_core")
+
 
 __author__ = "Xiaowei Oscar Tan"
 __version__ = '1.0.1'
@@ -55,6 +62,8 @@ class UvBatchTransfer(QtWidgets.QDialog):
                             ^ QtCore.Qt.WindowContextHelpButtonHint)
         # ui position
         self.geometry = None
+        # topology fingerprints cache
+        self.fingerprints = uv_batch_core.FingerprintCache()
         # widgets and layouts
         self.create_widgets()
         self.create_layouts()
@@ -73,9 +82,24 @@ class UvBatchTransfer(QtWidgets.QDialog):
 
         self.label_source = QtWidgets.QLabel("Source geos suffix: ")
         self.label_target = QtWidgets.QLabel("Target geos suffix: ")
+        self.label_separator = QtWidgets.QLabel("Suffix separator: ")
 
         self.line_edit_source = QtWidgets.QLineEdit()
         self.line_edit_target = QtWidgets.QLineEdit()
+        self.line_edit_separator = QtWidgets.QLineEdit("_")
+
+        self.label_chunk = QtWidgets.QLabel("Pairs per chunk: ")
+        self.spin_chunk = QtWidgets.QSpinBox()
+        self.spin_chunk.setRange(1, 100000)
+        self.spin_chunk.setValue(100)
+
+        self.checkbox_direct = QtWidgets.QCheckBox("Direct copy, no history")
+        self.checkbox_direct.setChecked(True)
+        self.checkbox_direct.setToolTip("Copy UV sets straight onto "
+                                        "targets. Unchecked, pairs go "
+                                        "through polyTransfer. Pairs with "
+                                        "different topology are skipped "
+                                        "and reported either way")
 
         self.button = QtWidgets.QPushButton("Batch Transfer UVs")
 
@@ -93,6 +117,9 @@ class UvBatchTransfer(QtWidgets.QDialog):
         layout_line = QtWidgets.QFormLayout()
         layout_line.addRow(self.label_source, self.line_edit_source)
         layout_line.addRow(self.label_target, self.line_edit_target)
+        layout_line.addRow(self.label_separator, self.line_edit_separator)
+        layout_line.addRow(self.label_chunk, self.spin_chunk)
+        layout_line.addRow("", self.checkbox_direct)
 
         layout_button = QtWidgets.QHBoxLayout()
         layout_button.addStretch()
@@ -113,56 +140,96 @@ class UvBatchTransfer(QtWidgets.QDialog):
 
         suffix_source = self.line_edit_source.text()
         suffix_target = self.line_edit_target.text()
+        separator = self.line_edit_separator.text()
 
-        list_sel = mc.ls(sl=True,
-                         long=True,
-                         dag=True) or []
-        list_mesh = mc.listRelatives(list_sel,
-                                     shapes=True,
-                                     type="mesh",
-                                     fullPath=True) or []
-        list_mesh_source = []
-        list_mesh_target = []
-        dict_mesh = {}  # {source: target}
+        list_sel = mc.ls(sl=True, long=True) or []
 
         if len(list_sel) == 0:
             om.MGlobal.displayWarning("Please select geos!")
         else:
-            # get "list_mesh_source"
-            for i in list_mesh:
-                # i_shape = i.split("|")[-1]
-                i_transform = i.split("|")[-2]
-                if suffix_source in i_transform:
-                    list_mesh_source.append(i)
-            # get "list_mesh_target"
-            for i in list_mesh:
-                # i_shape = i.split("|")[-1]
-                i_transform = i.split("|")[-2]
-                if suffix_target in i_transform:
-                    list_mesh_target.append(i)
-            # check if two groups of geo have some piece counts
-            if len(list_mesh_source) != len(list_mesh_target):
-                count_source = "sources " + str(len(list_mesh_source))
-                count_target = "targets " + str(len(list_mesh_target))
-                warning = "Two groups of geos have different numbers of pieces:"
-                om.MGlobal.displayWarning(' '.join((warning, count_source, count_target)))
-            else:
-                # get "dict_mesh"
-                for i in list_mesh_source:
-                    # i_shape = i.split("|")[-1]
-                    i_transform = i.split("|")[-2]
-                    prefix = i_transform[:-(len(suffix_source)+1)]
-                    # print prefix
-                    for j in list_mesh_target:
-                        if prefix in j:
-                            dict_mesh[i] = j
-                for source, target in dict_mesh.items():
-                    # do uv transfer
-                    mc.polyTransfer(target,
-                                    vertices=0,
-                                    vertexColor=0,
-                                    uvSets=1,
-                                    alternateObject=source)
+            list_mesh = uv_batch_core.list_meshes(list_sel)
+            # pair on exact prefixes and compare topology of every pair
+            # before editing anything
+            result, list_pairs, list_mismatch = uv_batch_core.plan_transfer(
+                list_mesh, suffix_source, suffix_target, separator,
+                self.fingerprints.get)
+            self.report_match(result)
+            self.report_mismatch(list_mismatch)
+            self.run_transfer(list_pairs)
+
+    def run_transfer(self, list_pairs):
+
+        """ transfer pairs chunk by chunk, one undo step per chunk """
+
+        direct = self.checkbox_direct.isChecked()
+        job = chunked_job.ChunkedJob(
+            list_pairs,
+            lambda pair: uv_batch_core.transfer_pair(pair[0], pair[1], direct),
+            chunk_size=self.spin_chunk.value(),
+            chunk_context=lambda: api_undo.undo_chunk("txUvBatchTransfer"))
+
+        progress = QtWidgets.QProgressDialog("Transferring UVs...", "Cancel",
+                                             0, len(list_pairs), self)
+        progress.setWindowTitle("tx UV Batch Transfer")
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def on_progress(num_done, num_total, rate, eta):
+            progress.setValue(num_done)
+            progress.setLabelText("{0} / {1} pairs  {2:.1f} pairs/sec  "
+                                  "ETA {3:.0f}s".format(num_done, num_total,
+                                                        rate, eta))
+            # let the cancel button be clicked in between chunks
+            QtWidgets.QApplication.processEvents()
+
+        result = job.run(on_progress=on_progress,
+                         is_cancelled=progress.wasCanceled)
+        progress.close()
+
+        info = "{0} / {1} pairs transferred in {2:.1f}s.".format(
+            result.num_done, result.num_total, result.seconds)
+        if result.error is not None:
+            om.MGlobal.displayError("{0} Stopped by error, the failing "
+                                    "chunk was rolled back: {1}"
+                                    .format(info, result.error))
+        elif result.cancelled:
+            om.MGlobal.displayWarning(info + " Cancelled.")
+        else:
+            om.MGlobal.displayInfo(info)
+
+    def report_mismatch(self, list_mismatch):
+        for source, target in list_mismatch:
+            om.MGlobal.displayInfo("txUvBatchTransfer: topology mismatch "
+                                   "{0} -> {1}".format(source, target))
+        if list_mismatch:
+            warning = ("{0} pairs skipped for different topology. "
+                       "See script editor for details.")
+            om.MGlobal.displayWarning(warning.format(len(list_mismatch)))
+
+    def report_match(self, result):
+        for path in result.unmatched_sources:
+            om.MGlobal.displayInfo("txUvBatchTransfer: no target for "
+                                   + path)
+        for path in result.unmatched_targets:
+            om.MGlobal.displayInfo("txUvBatchTransfer: no source for "
+                                   + path)
+        for key, (sources, targets) in sorted(result.ambiguous.items()):
+            om.MGlobal.displayInfo("txUvBatchTransfer: ambiguous '{0}': "
+                                   "{1} -> {2}".format(key, sources,
+                                                       targets))
+        num_skipped = (len(result.unmatched_sources)
+                       + len(result.unmatched_targets)
+                       + len(result.ambiguous))
+        if num_skipped:
+            warning = ("{0} pairs matched, {1} unmatched sources, "
+                       "{2} unmatched targets, {3} ambiguous names "
+                       "skipped. See script editor for details.")
+            om.MGlobal.displayWarning(
+                warning.format(len(result.pairs),
+                               len(result.unmatched_sources),
+                               len(result.unmatched_targets),
+                               len(result.ambiguous)))
+
     def showEvent(self, e):
         super(UvBatchTransfer, self).showEvent(e)
 
@@ -174,6 +241,7 @@ class UvBatchTransfer(QtWidgets.QDialog):
             super(UvBatchTransfer, self).closeEvent(e)
 
             self.geometry = self.saveGeometry()
+            self.fingerprints.clear()
 
 if __name__ == '__main__':
     # delete UI if there's one already open
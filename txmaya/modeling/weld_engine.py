@@ -0,0 +1,210 @@
+'''
+Summary:
+symmetry plane fitting and mirror-merge geometry used by tx Mirrorer.
+
+Seam vertices are matched with a spatial hash (a uniform grid of
+tolerance-sized cells, looked up over the 27 neighbouring cells) instead
+of comparing every pair, so half meshes with 500k+ vertices weld in
+seconds.
+'''
+
+import numpy as np
+
+from txmaya.modeling import mirror_engine
+from txmaya.modeling.texel_density_engine import face_offsets
+
+
+# large primes spreading cell coordinates over the hash keys
+_HASH_PRIMES = (73856093, 19349663, 83492791)
+_NEIGHBOUR_OFFSETS = np.array([(x, y, z)
+                               for x in (-1, 0, 1)
+                               for y in (-1, 0, 1)
+                               for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def fit_symmetry_plane(points, normal, tolerance):
+    """
+    Return a point on the best symmetry plane with the given normal,
+    fitted from the points' bounds: the bounding side holding the most
+    points (a half mesh's open seam), or the middle of the bounds when
+    no side holds any
+    """
+    normal = np.asarray(normal, dtype=np.float64)
+    normal = normal / np.linalg.norm(normal)
+    points = np.asarray(points, dtype=np.float64)[:, :3]
+    if len(points) == 0:
+        return np.zeros(3)
+    height = np.dot(points, normal)
+    height_min = height.min()
+    height_max = height.max()
+    num_min = np.count_nonzero(height - height_min <= tolerance)
+    num_max = np.count_nonzero(height_max - height <= tolerance)
+    center = points.mean(axis=0)
+    # move the center along the normal onto the chosen height
+    if num_min == 0 and num_max == 0:
+        height_plane = (height_min + height_max) * 0.5
+    elif num_min >= num_max:
+        height_plane = height_min
+    else:
+        height_plane = height_max
+    return center + (height_plane - np.dot(center, normal)) * normal
+
+
+def _hash_cells(cells):
+    return ((cells[:, 0] * _HASH_PRIMES[0])
+            ^ (cells[:, 1] * _HASH_PRIMES[1])
+            ^ (cells[:, 2] * _HASH_PRIMES[2]))
+
+
+def spatial_hash_match(points_a, points_b, tolerance):
+    """
+    For every point of points_b, return the index of the nearest point of
+    points_a within tolerance, -1 when there is none
+    """
+    points_a = np.asarray(points_a, dtype=np.float64)[:, :3]
+    points_b = np.asarray(points_b, dtype=np.float64)[:, :3]
+    match = np.full(len(points_b), -1, dtype=np.int64)
+    if len(points_a) == 0 or len(points_b) == 0:
+        return match
+    tolerance = max(float(tolerance), 1e-12)
+    # bucket a into tolerance sized cells, sorted by hash key
+    cells_a = np.floor(points_a / tolerance).astype(np.int64)
+    keys_a = _hash_cells(cells_a)
+    order_a = np.argsort(keys_a, kind='mergesort')
+    keys_a_sorted = keys_a[order_a]
+    cells_b = np.floor(points_b / tolerance).astype(np.int64)
+
+    best_distance = np.full(len(points_b), np.inf)
+    for offset in _NEIGHBOUR_OFFSETS:
+        keys_b = _hash_cells(cells_b + offset)
+        start = np.searchsorted(keys_a_sorted, keys_b, side='left')
+        end = np.searchsorted(keys_a_sorted, keys_b, side='right')
+        num_candidates = end - start
+        if not num_candidates.any():
+            continue
+        # expand every b into its candidate a's
+        index_b = np.repeat(np.arange(len(points_b)), num_candidates)
+        first = np.repeat(np.cumsum(num_candidates) - num_candidates,
+                          num_candidates)
+        index_a = order_a[np.repeat(start, num_candidates)
+                          + np.arange(len(index_b)) - first]
+        # hash collisions land here too, the distance check sorts them out
+        delta = points_a[index_a] - points_b[index_b]
+        distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        closer = (distance <= tolerance) & (distance < best_distance[index_b])
+        index_a = index_a[closer]
+        index_b = index_b[closer]
+        distance = distance[closer]
+        # keep the nearest candidate per b
+        order = np.lexsort((distance, index_b))
+        index_b = index_b[order]
+        is_first = np.ones(len(index_b), dtype=bool)
+        is_first[1:] = index_b[1:] != index_b[:-1]
+        index_b = index_b[is_first]
+        best_distance[index_b] = distance[order][is_first]
+        match[index_b] = index_a[order][is_first]
+    return match
+
+
+def reverse_winding(face_counts, face_indices):
+    """
+    Return face_indices with every face's order reversed, keeping each
+    face's first corner first ([a, b, c, d] -> [a, d, c, b])
+    """
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_indices = np.asarray(face_indices, dtype=np.int64)
+    corner_face = np.repeat(np.arange(len(face_counts)), face_counts)
+    start = face_offsets(face_counts)[corner_face]
+    local = np.arange(len(face_indices)) - start
+    count = face_counts[corner_face]
+    return face_indices[start + (count - local) % count]
+
+
+def mirror_merge(points, face_counts, face_vertices, reflection, tolerance):
+    """
+    Append the reflected copy of a mesh to itself and weld the copy's
+    vertices lying on the original seam.
+    reflection: 4x4 matrix in the points' space.
+    Return (points, face counts, face vertices, map of the copy's
+    vertices into the merged points)
+    """
+    points = np.asarray(points, dtype=np.float64)[:, :3]
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_vertices = np.asarray(face_vertices, dtype=np.int64)
+    num_points = len(points)
+    points_mirror = mirror_engine.transform_points(points, reflection)
+    # only vertices close to the plane can weld: those that barely move
+    seam = np.nonzero(np.linalg.norm(points_mirror - points, axis=1)
+                      <= 2.0 * tolerance)[0]
+    match = spatial_hash_match(points[seam], points_mirror[seam], tolerance)
+    vertex_map = np.full(num_points, -1, dtype=np.int64)
+    vertex_map[seam[match >= 0]] = seam[match[match >= 0]]
+    # unwelded copies go after the original points
+    keep = vertex_map < 0
+    vertex_map[keep] = num_points + np.arange(np.count_nonzero(keep))
+    points_merged = np.concatenate((points, points_mirror[keep]))
+    # the copy's faces need reversed winding to face outwards
+    face_vertices_mirror = vertex_map[reverse_winding(face_counts,
+                                                      face_vertices)]
+    return (points_merged,
+            np.concatenate((face_counts, face_counts)),
+            np.concatenate((face_vertices, face_vertices_mirror)),
+            vertex_map)
+
+
+def mirror_merge_edges(edges, vertex_map):
+    """
+    Return the edges, as (n, 2) vertex pairs, of mirror_merge's result:
+    the original ones and their copies, each once
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = np.sort(np.concatenate((edges, vertex_map[edges])), axis=1)
+    if not len(edges):
+        return edges
+    return np.unique(edges, axis=0)
+
+
+def mirror_merge_uvs(u, v, uv_counts, uv_ids):
+    """
+    Append a u-flipped copy of the uvs matching mirror_merge's copied faces.
+    Return (u, v, uv counts, uv ids)
+    """
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    uv_counts = np.asarray(uv_counts, dtype=np.int64)
+    uv_ids = np.asarray(uv_ids, dtype=np.int64)
+    uv_ids_mirror = reverse_winding(uv_counts, uv_ids) + len(u)
+    return (np.concatenate((u, mirror_engine.flip_u(u))),
+            np.concatenate((v, v)),
+            np.concatenate((uv_counts, uv_counts)),
+            np.concatenate((uv_ids, uv_ids_mirror)))
+
+
+if __name__ == '__main__':
+    import time
+
+    for grid_size in (100, 400, 710):
+        # half of a bumpy sheet, its seam on the x = 0 plane
+        coords = np.linspace(0.0, 10.0, grid_size + 1)
+        xx, zz = np.meshgrid(coords, coords)
+        points = np.column_stack((xx.ravel(),
+                                  np.sin(xx.ravel()) * np.cos(zz.ravel()),
+                                  zz.ravel()))
+        row = np.arange(grid_size)
+        corner = (row[None, :] + row[:, None] * (grid_size + 1)).ravel()
+        face_vertices = np.column_stack((corner,
+                                         corner + 1,
+                                         corner + grid_size + 2,
+                                         corner + grid_size + 1)).ravel()
+        face_counts = np.full(grid_size * grid_size, 4)
+
+        time_start = time.time()
+        plane_point = fit_symmetry_plane(points, (1, 0, 0), 1e-4)
+        reflection = mirror_engine.reflection_matrix((1, 0, 0), plane_point)
+        merged = mirror_merge(points, face_counts, face_vertices,
+                              reflection, 1e-4)
+        time_cost = time.time() - time_start
+        num_welded = 2 * len(points) - len(merged[0])
+        print("{0} vertices: {1} welded in {2:.3f}s".format(len(points),
+                                                          num_welded,
+                                                          time_cost))